@@ -1,5 +1,4 @@
 import os
-import re
 import subprocess
 import sys
 import shutil
@@ -12,65 +11,48 @@ from PySide2.QtCore import *
 # from PySide2.QtWidgets import QTreeView
 # from PySide2.QtGui import QStandardItemModel
 
-import re
+# Directory listings shared with StockManager and TreeViewNuke
+from sequence_util import sequence_cache
 
 class ImageSequenceProxyModel(QSortFilterProxyModel):
     def __init__(self, parent=None):
         super(ImageSequenceProxyModel, self).__init__(parent)
-        self._sequences = {}
 
     def setSourceModel(self, sourceModel):
         super(ImageSequenceProxyModel, self).setSourceModel(sourceModel)
         self.invalidateFilter()
 
+    def getSequence(self, file_path):
+        # The sequence of a 'name.1001.exr' or 'name_1001.exr' file with more than one frame
+        sequence = sequence_cache.get_file_sequence(file_path)
+        if not sequence or len(sequence) < 2 or sequence.prefix[-1:] not in ('.', '_'):
+            return None
+
+        return sequence
+
     def filterAcceptsRow(self, source_row, source_parent):
         source_index = self.sourceModel().index(source_row, 0, source_parent)
-        file_path = self.sourceModel().filePath(source_index)
-        file_name = self.sourceModel().fileName(source_index)
 
         # Show directories
         if self.sourceModel().isDir(source_index):
             return True
 
-        # Check if it's part of a sequence
-        match = re.match(r'(.+?)[._](\d+)\.(.+)', file_name)
-        if not match:
+        file_name = self.sourceModel().fileName(source_index)
+        sequence = self.getSequence(self.sourceModel().filePath(source_index))
+        if not sequence:
             return True  # Not a sequence file
 
-        base_name, frame_str, ext = match.groups()
-        frame = int(frame_str)
-
-        seq_key = (os.path.dirname(file_path), f"{base_name}.%0{len(frame_str)}d.{ext}")
-
-        if seq_key not in self._sequences:
-            self._sequences[seq_key] = {'frames': set(), 'min': float('inf'), 'max': float('-inf'), 'first_path': None}
-
-        if frame not in self._sequences[seq_key]['frames']:
-            self._sequences[seq_key]['frames'].add(frame)
-            if frame < self._sequences[seq_key]['min']:
-                self._sequences[seq_key]['min'] = frame
-                self._sequences[seq_key]['first_path'] = file_path
-            if frame > self._sequences[seq_key]['max']:
-                self._sequences[seq_key]['max'] = frame
-
         # Only show the first frame of the sequence
-        return file_path == self._sequences[seq_key]['first_path']
+        return file_name == sequence.get_filename(sequence.first())
 
     def data(self, index, role=Qt.DisplayRole):
         if role == Qt.DisplayRole:
             source_index = self.mapToSource(index)
             file_path = self.sourceModel().filePath(source_index)
-            file_name = self.sourceModel().fileName(source_index)
-
-            match = re.match(r'(.+?)[._](\d+)\.(.+)', file_name)
-            if match:
-                base_name, frame_str, ext = match.groups()
-                seq_key = (os.path.dirname(file_path), f"{base_name}.%0{len(frame_str)}d.{ext}")
 
-                if seq_key in self._sequences:
-                    seq_info = self._sequences[seq_key]
-                    if file_path == seq_info['first_path']:
-                        return f"{base_name}.[{seq_info['min']}-{seq_info['max']}].{ext}"
+            sequence = None if self.sourceModel().isDir(source_index) else self.getSequence(file_path)
+            if sequence:
+                return f"{sequence.prefix[:-1]}.[{sequence.first()}-{sequence.last()}].{sequence.ext}"
 
         return super(ImageSequenceProxyModel, self).data(index, role)
 
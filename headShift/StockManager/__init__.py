@@ -1,7 +1,9 @@
-import nuke
+from .nuke_util.nuke_util import nuke
 
-from . import src as stock_manager
-from .nuke_util import panels
+# the headless nuke workers import the converter without the panels
+if nuke and nuke.GUI:
+    from . import src as stock_manager
+    from .nuke_util import panels
 
 
 def setup():
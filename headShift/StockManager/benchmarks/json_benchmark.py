@@ -0,0 +1,151 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Jose Contreras Cuevas
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+# 'jread' and 'jwrite' of 'python_util/util.py' against the previous ones,
+# which built the whole indented string in memory and read it back into
+# OrderedDicts, on a catalog like the old 'stocks.json' and on a manifest.
+# Runs without Nuke:
+#
+#   python benchmarks/json_benchmark.py --entries 100000
+#   python benchmarks/json_benchmark.py --entries 100000 --no-orjson
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import importlib
+import tracemalloc
+from collections import OrderedDict
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(root))
+
+util = importlib.import_module(os.path.basename(root) + '.python_util.util')
+
+
+def legacy_jwrite(file, data):
+    f = open(file, 'w')
+    f.write(json.dumps(data, indent=4))
+    f.close()
+
+
+def legacy_jread(file):
+    f = open(file, 'r')
+    readed = str(f.read().strip())
+    f.close()
+
+    return json.loads(readed, object_pairs_hook=OrderedDict)
+
+
+def get_catalog(entries):
+    stocks = OrderedDict()
+
+    for i in range(entries):
+        path = '/stocks/fire_{}/fire_{}_####.exr'.format(i % 500, i)
+        stocks[path] = {
+            'path': path,
+            'element': 'fire',
+            'type': 'not labeled',
+            'folder': '/stocks',
+            'name': 'fire_{}'.format(i),
+            'resolution': [1920, 1080],
+            'indexed': '/indexed/{:032x}'.format(i),
+            'passes': False,
+            'frames': 120,
+            'first_frame': 1001,
+            'last_frame': 1120,
+            'is_sequence': True,
+            'fps': 24.0,
+            'codec': 'exr',
+            'pix_fmt': 'rgba',
+            'duration': 5.0,
+            'channel_layout': ''
+        }
+
+    return stocks
+
+
+def get_manifest(entries):
+    # the manifest of 'indexing': folder -> directory -> entry
+    folder = {}
+
+    for i in range(entries):
+        folder['/stocks/dir_{}'.format(i)] = {
+            'mtime': 1700000000.0 + i,
+            'scanned': 1700000100.0 + i,
+            'files': 120,
+            'size': 120 * 1048576,
+            'dirs': [],
+            'force_textures': False,
+            'stocks': [['/stocks/dir_{}/fire_####.exr'.format(i), 1001, 1120, 120, True]]
+        }
+
+    return {'/stocks': folder}
+
+
+def timed(fn, *args):
+    start = time.time()
+    fn(*args)
+    elapsed = time.time() - start
+
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed, peak
+
+
+def compare(label, data, tmp_dir):
+    legacy_file = os.path.join(tmp_dir, label + '_legacy.json')
+    new_file = os.path.join(tmp_dir, label + '.json')
+
+    print(label)
+
+    for name, fn, file in [
+        ('  previous jwrite', legacy_jwrite, legacy_file),
+        ('  jwrite compact', lambda f, d: util.jwrite(f, d, compact=True), new_file)
+    ]:
+        elapsed, peak = timed(fn, file, data)
+        print('{:<24}{:>8.3f} s {:>8.1f} MB peak {:>8.1f} MB file'.format(
+            name, elapsed, peak / 1048576.0, os.path.getsize(file) / 1048576.0))
+
+    for name, fn, file in [
+        ('  previous jread', legacy_jread, legacy_file),
+        ('  jread', util.jread, new_file)
+    ]:
+        elapsed, peak = timed(fn, file)
+        print('{:<24}{:>8.3f} s {:>8.1f} MB peak'.format(name, elapsed, peak / 1048576.0))
+
+    assert util.jread(new_file) == json.loads(json.dumps(data))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--no-orjson', action='store_true',
+                        help='time the json module even if orjson is installed')
+    args = parser.parse_args()
+
+    if args.no_orjson:
+        util.orjson = None
+
+    print('{} entries, orjson: {}'.format(args.entries, bool(util.orjson)))
+
+    tmp_dir = tempfile.mkdtemp()
+
+    try:
+        compare('catalog', get_catalog(args.entries), tmp_dir)
+        compare('manifest', get_manifest(args.entries), tmp_dir)
+    finally:
+        for name in os.listdir(tmp_dir):
+            os.remove(os.path.join(tmp_dir, name))
+        os.rmdir(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
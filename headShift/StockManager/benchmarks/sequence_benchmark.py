@@ -0,0 +1,121 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Jose Contreras Cuevas
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+# Sequence grouping of 'sequence_util/sequence.py' against the previous path,
+# where every short sequence re-listed its directory with
+# 'media_util.get_sequence', now served by 'sequence_util/sequence_cache.py'.
+# Runs without Nuke:
+#
+#   python benchmarks/sequence_benchmark.py --files 1000000
+#   python benchmarks/sequence_benchmark.py --files 100000 --disk /tmp/seq_bench
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import importlib
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(root))
+
+package = os.path.basename(root)
+sequence = importlib.import_module('sequence_util.sequence')
+sequence_cache = importlib.import_module('sequence_util.sequence_cache')
+media_util = importlib.import_module(package + '.nuke_util.media_util')
+
+
+def get_filenames(files, frames):
+    # sequences of 'frames' frames with mixed paddings, gaps and textures
+    filenames = []
+    i = 0
+
+    while len(filenames) < files:
+        name = 'stock_{}_v{:03d}'.format(i, i % 7)
+
+        if i % 10 == 0:
+            filenames.append(name + '.jpg')
+        else:
+            padding = 4 if i % 3 else 6
+            for frame in range(1, frames + 1):
+                if i % 5 == 0 and frame % 13 == 0:
+                    continue
+                filenames.append('{}.{}.exr'.format(name, str(frame).zfill(padding)))
+
+        i += 1
+
+    return filenames[:files]
+
+
+def legacy_group(directory, filenames, cached=False):
+    # the previous path with the nuke listing already done: every sequence
+    # is expanded again with 'get_sequence', which listed the directory
+    # before the sequence cache
+    _, sequences = sequence.group(filenames)
+
+    files = 0
+    for seq in sequences:
+        if not cached:
+            sequence_cache.invalidate()
+
+        files += len(media_util.get_sequence(
+            '{}/{}'.format(directory, seq.get_pattern()), [seq.first(), seq.last()]))
+
+    return files
+
+
+def timed(label, fn, *args):
+    start = time.time()
+    result = fn(*args)
+    print('{:<36}{:>10.3f} s'.format(label, time.time() - start))
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=1000000)
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--disk', default='',
+                        help='directory where the files are created to also time the listing')
+    parser.add_argument('--legacy-sequences', type=int, default=50,
+                        help='sequences re-listed by the previous path, it is extrapolated')
+    args = parser.parse_args()
+
+    filenames = get_filenames(args.files, args.frames)
+    print('{} files'.format(len(filenames)))
+
+    _, sequences = timed('sequence.group (in memory)', sequence.group, filenames)
+    print('{} sequences'.format(len(sequences)))
+
+    if not args.disk:
+        return
+
+    if os.path.isdir(args.disk):
+        shutil.rmtree(args.disk)
+    os.makedirs(args.disk)
+
+    for filename in filenames:
+        open(os.path.join(args.disk, filename), 'w').close()
+
+    sequence_cache.invalidate()
+    timed('sequence_cache (one listing)', sequence_cache.get_sequences, args.disk)
+
+    sample = filenames[:args.legacy_sequences * args.frames]
+    sampled = max(1, len(sequence.group(sample)[1]))
+
+    for label, cached in [('get_sequence per sequence', False), ('get_sequence (sequence cache)', True)]:
+        start = time.time()
+        legacy_group(args.disk, sample, cached)
+        elapsed = time.time() - start
+
+        print('{:<36}{:>10.3f} s (extrapolated from {} sequences)'.format(
+            label, elapsed * len(sequences) / sampled, sampled))
+
+    shutil.rmtree(args.disk)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+# Author: Francisco Jose Contreras Cuevas
+# Office: VFX Artist - Senior Compositor
+# Website: vinavfx.com
+#
+# Indexes the connected folders without Nuke or a GUI, so it can run on a
+# render node or from cron. From the folder that contains StockManager:
+#
+#   python -m StockManager.index
+#   python -m StockManager.index --jobs 16 --folders /stocks/fire /stocks/smoke
+#   python -m StockManager.index --dry-run
+#   python -m StockManager.index --data-dir /mnt/home/artist/.nuke/stock_manager_indexing
+#
+# Folders given with --folders that are not connected yet are connected.
+#
+# The catalog, the previews and the settings are read from and written to
+# '~/.nuke/stock_manager_indexing' of the user that runs the command. On a
+# farm that runs as a render user, point it to the folder of the artists
+# with --data-dir, or with the STOCK_MANAGER_DATA environment variable,
+# which the Nuke panel reads as well.
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+
+from .src.converter import get_ffmpeg
+
+log = logging.getLogger('stock_manager')
+
+# imported by 'main' once the data folder is known, since its paths are
+# set when it is imported
+indexing = None
+
+
+def get_arguments():
+    parser = argparse.ArgumentParser(
+        prog='python -m StockManager.index',
+        description='Indexes the Stock Manager folders without Nuke.')
+
+    parser.add_argument('--jobs', type=int, default=0,
+                        help='stocks converted at the same time, the default is the "jobs" setting')
+    parser.add_argument('--folders', nargs='+', default=[],
+                        help='only index these folders, the default is all connected folders')
+    parser.add_argument('--data-dir', default='',
+                        help='folder of the catalog and the previews, the default is '
+                        'STOCK_MANAGER_DATA or ~/.nuke/stock_manager_indexing')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='only list the stocks that would be indexed')
+    parser.add_argument('--log', default='',
+                        help='also write the progress to this file')
+    parser.add_argument('--verbose', action='store_true',
+                        help='log every indexed stock, not only the folders')
+
+    return parser.parse_args()
+
+
+def setup_log(log_file, verbose):
+    formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
+    handlers = [logging.StreamHandler()]
+
+    if log_file:
+        handlers.append(logging.FileHandler(log_file))
+
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        log.addHandler(handler)
+
+    log.setLevel(logging.DEBUG if verbose else logging.INFO)
+
+
+def get_folders(paths, connect=True):
+    # connects the folders that are not connected yet
+    connected = indexing.get_indexed_folder()
+    folders = []
+
+    for path in paths:
+        folder = os.path.abspath(path).replace('\\', '/')
+
+        if not os.path.isdir(folder):
+            log.error('Folder not found: {}'.format(folder))
+            continue
+
+        if connect and not folder in connected:
+            log.info('Connecting folder: {}'.format(folder))
+            indexing.save_indexed_folder(folder)
+
+        folders.append(folder)
+
+    return folders
+
+
+def dry_run(folders):
+    total = 0
+
+    for folder in folders:
+        states = {}
+
+        for stock, changed in indexing.get_stocks_from_folder(folder):
+            state = indexing.get_index_state(stock, changed)
+            states[state] = states.get(state, 0) + 1
+
+            if state == 'indexed':
+                continue
+
+            total += 1
+            log.debug('{} ({})'.format(stock[0], state))
+
+        log.info('{}: {} new, {} without preview, {} with a new frame range, {} indexed'.format(
+            folder, states.get('new', 0), states.get('no_preview', 0),
+            states.get('new_range', 0), states.get('indexed', 0)))
+
+    log.info('{} stocks would be indexed'.format(total))
+
+
+def run(folders):
+    stop = threading.Event()
+    start_time = time.time()
+
+    def each_fn(name, folder, percent, amount):
+        log.debug('[{}%] {}: {}'.format(percent, os.path.basename(folder), name))
+
+    def progress_fn(progress):
+        log.debug('{}: {}/{} frames, {:.1f} fps, {:.1f} MB/s, {:.0f} s left'.format(
+            progress['name'], progress['frame'], progress['frames'],
+            progress['fps'], progress['mb_per_second'], max(progress['eta'], 0)))
+
+    def each_folder_fn(folder, amount):
+        log.info('{}: {} stocks'.format(folder, amount))
+
+    def finished_fn():
+        log.info('Finished in {:.1f} s, {} stocks indexed, {:.1f} GB of previews'.format(
+            time.time() - start_time, indexing.get_total_stocks(),
+            indexing.get_store_size() / (1024.0 ** 3)))
+
+    # ffmpeg only reports its progress when it is logged
+    verbose = log.isEnabledFor(logging.DEBUG)
+
+    failed = []
+
+    def index():
+        try:
+            indexing.to_index(finished_fn, each_folder_fn, each_fn, stop.is_set,
+                              folders, progress_fn if verbose else None)
+        except Exception:
+            log.exception('The indexing failed')
+            failed.append(True)
+
+    thread = threading.Thread(target=index)
+
+    thread.daemon = True
+    thread.start()
+
+    # the indexing runs in a thread so that Ctrl+C stops it like the 'Stop'
+    # button does, letting it save the catalog and the manifest
+    while thread.is_alive():
+        try:
+            thread.join(0.5)
+        except KeyboardInterrupt:
+            if stop.is_set():
+                log.warning('Waiting for the running conversions to finish')
+            else:
+                log.warning('Stopping...')
+                stop.set()
+
+    return not stop.is_set() and not failed
+
+
+def main():
+    global indexing
+
+    args = get_arguments()
+    setup_log(args.log, args.verbose or args.dry_run)
+
+    if args.data_dir:
+        os.environ['STOCK_MANAGER_DATA'] = os.path.abspath(args.data_dir)
+
+    from .src import indexing
+
+    log.info('Data folder: {}'.format(indexing.stock_manager_folder))
+
+    if not args.dry_run:
+        ffmpeg, ffprobe = get_ffmpeg()
+        if not ffmpeg or not ffprobe:
+            log.error('You need to install ffmpeg and ffprobe to index !')
+            return 1
+
+    indexing.load_data()
+
+    if args.jobs > 0:
+        indexing.settings['jobs'] = args.jobs
+
+    if args.folders:
+        folders = get_folders(args.folders, not args.dry_run)
+        if not folders:
+            return 1
+    else:
+        folders = list(indexing.get_indexed_folder())
+
+    if not folders:
+        log.error('There are no connected folders, add them with --folders')
+        return 1
+
+    if args.dry_run:
+        dry_run(folders)
+        return 0
+
+    log.info('Indexing {} folders with {} jobs'.format(
+        len(folders), indexing.get_setting('jobs')))
+
+    return 0 if run(folders) else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,11 @@
 from . import (
     nuke_util,
     media_util,
-    panels,
-    func_exec,
-    nodes
+    func_exec
 )
+
+if nuke_util.nuke and nuke_util.nuke.GUI:
+    from . import (
+        panels,
+        nodes
+    )
@@ -7,6 +7,8 @@
 import re
 import os
 
+from sequence_util import sequence_cache
+
 
 def is_absolute(filename):
     if '../' in filename:
@@ -123,36 +125,21 @@ def is_sequence(filename):
 
 def get_sequence(filename, frange=None):
     padding = get_padding(filename)
-    basename = os.path.basename(filename)
 
     if not padding:
         return [filename]
 
-    prefix, suffix = basename.rsplit(padding, 1)
-    no_padding = prefix + suffix
-    no_number = ''.join([i for i in no_padding if not i.isdigit()])
-
     dirname = os.path.dirname(filename)
     if not os.path.isdir(dirname):
         return []
 
-    sequence_list = []
-
-    for f in os.listdir(dirname):
-        if not prefix in f or not suffix in f:
-            continue
-
-        _no_number = ''.join([i for i in f if not i.isdigit()])
-
-        if not len(_no_number) == len(no_number):
-            continue
-
-        if not frange == None:
-            pre = f[:len(prefix)]
-            number = int(f.split(pre, 1)[1][:-len(suffix)])
-            if not number in range(frange[0], frange[1] + 1):
-                continue
+    # the directory is listed once and shared with the other tools
+    _sequence = sequence_cache.get_sequence(filename)
+    if not _sequence:
+        return []
 
-        sequence_list.append(os.path.join(dirname, f))
+    frames = _sequence.frames
+    if not frange == None:
+        frames = [f for f in frames if frange[0] <= f <= frange[1]]
 
-    return sequence_list
+    return [os.path.join(dirname, _sequence.get_filename(f)) for f in frames]
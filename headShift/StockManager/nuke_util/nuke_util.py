@@ -6,8 +6,14 @@
 import os
 import platform
 import colorsys
-import nuke  # type: ignore
-import nukescripts  # type: ignore
+
+try:
+    import nuke  # type: ignore
+    import nukescripts  # type: ignore
+except ImportError:
+    # outside of nuke, only the path functions can be used
+    nuke = None
+    nukescripts = None
 
 if platform.system() == 'Linux':
     user_path = os.path.expanduser('~')
@@ -110,6 +116,9 @@ def get_nuke_path():
 
 
 def get_nuke_executable():
+    if not nuke:
+        return os.environ.get('NUKE_EXECUTABLE', '')
+
     executable = '/opt/Nuke{}/nuke'.format(nuke.NUKE_VERSION_STRING)
 
     if os.path.isfile(executable):
@@ -231,7 +240,10 @@ def get_output_nodes(node, force=True):
         return []
 
 
-def add_key(knob, value, frame, dimension=0, interpolation=nuke.HORIZONTAL):
+def add_key(knob, value, frame, dimension=0, interpolation=None):
+    if interpolation is None:
+        interpolation = nuke.HORIZONTAL
+
     knob.setAnimated()
     knob.setValueAt(value, frame, dimension)
 
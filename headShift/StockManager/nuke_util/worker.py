@@ -0,0 +1,148 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Jose Contreras Cuevas
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+# Worker of 'worker_pool', it is started by the pool as:
+#
+#   nuke -t worker.py <port> <token>
+#   python worker.py <port> <token>     (stand-in worker, without nuke)
+#
+# It connects to the pool and runs the functions it receives until the pool
+# sends 'quit' or closes the connection. This file is run as a script, so it
+# does not import anything of the package.
+#
+# Messages are JSON with a 4 bytes big-endian length before them:
+#
+#   worker -> pool:   {"token": ..., "pid": ..., "nuke": true}
+#   pool -> worker:   {"function": "module.function", "data": ...}
+#   worker -> pool:   {"ok": true, "result": ..., "output": "..."}
+#                     {"ok": false, "error": "traceback", "output": "..."}
+#   pool -> worker:   {"quit": true}
+
+import io
+import os
+import sys
+import json
+import socket
+import struct
+import traceback
+import importlib
+import contextlib
+
+try:
+    import nuke  # type: ignore
+except ImportError:
+    nuke = None
+
+header = struct.Struct('>I')
+
+
+def receive_exactly(connection, size):
+    data = b''
+
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            raise EOFError('Connection closed')
+
+        data += chunk
+
+    return data
+
+
+def send_message(connection, message):
+    data = json.dumps(message).encode('utf-8')
+    connection.sendall(header.pack(len(data)) + data)
+
+
+def receive_message(connection):
+    size, = header.unpack(receive_exactly(connection, header.size))
+    return json.loads(receive_exactly(connection, size).decode('utf-8'))
+
+
+def get_function(name):
+    # 'name' is a module path followed by attributes, like the expressions
+    # 'exec_function' used to evaluate: 'package.module.function', or
+    # 'package.alias.function' when a package imports a module under another
+    # name. The longest importable prefix is imported and the rest is
+    # resolved as attributes, importing the submodules not imported yet.
+    parts = name.split('.')
+    obj = None
+
+    for i in range(len(parts) - 1, 0, -1):
+        module_name = '.'.join(parts[:i])
+
+        try:
+            obj = importlib.import_module(module_name)
+            break
+        except ImportError as error:
+            missing = getattr(error, 'name', None) or ''
+
+            # an import that fails inside the module is a real error
+            if not (module_name == missing or module_name.startswith(missing + '.')):
+                raise
+
+    if obj is None:
+        raise ImportError('No module to import in: {}'.format(name))
+
+    for attribute in parts[i:]:
+        try:
+            obj = getattr(obj, attribute)
+        except AttributeError:
+            obj = importlib.import_module('{}.{}'.format(obj.__name__, attribute))
+
+    return obj
+
+
+def run(message):
+    output = io.StringIO()
+
+    try:
+        with contextlib.redirect_stdout(output):
+            result = get_function(message['function'])(message['data'])
+
+        response = {'ok': True, 'result': result}
+    except:
+        response = {'ok': False, 'error': traceback.format_exc()}
+
+    response['output'] = output.getvalue()
+
+    if nuke:
+        # every job starts with an empty script
+        nuke.scriptClear()
+
+    return response
+
+
+def main():
+    port = int(sys.argv[1])
+    token = sys.argv[2]
+
+    connection = socket.create_connection(('127.0.0.1', port))
+    send_message(connection, {
+        'token': token,
+        'pid': os.getpid(),
+        'nuke': not nuke is None
+    })
+
+    while True:
+        try:
+            message = receive_message(connection)
+        except EOFError:
+            break
+
+        if message.get('quit'):
+            break
+
+        try:
+            send_message(connection, run(message))
+        except (TypeError, ValueError):
+            # the result can not be sent as JSON
+            send_message(connection, {'ok': False, 'error': traceback.format_exc(), 'output': ''})
+
+    connection.close()
+
+
+if __name__ == '__main__':
+    main()
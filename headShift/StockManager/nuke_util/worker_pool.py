@@ -0,0 +1,241 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Jose Contreras Cuevas
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+# Pool of long-lived headless nuke processes ('nuke -t worker.py'), so the
+# functions run with 'exec_function' do not pay the startup and the license
+# checkout of nuke on every call. The workers connect to a local socket of
+# the pool and the jobs go through it, the protocol is in 'worker.py'.
+#
+# With 'stand_in=True' the workers are the current python instead of nuke,
+# to test the pool and the jobs that do not need nuke.
+
+import os
+import sys
+import time
+import uuid
+import atexit
+import socket
+import threading
+import subprocess
+from queue import Queue, Empty
+
+from .worker import send_message, receive_message
+from .nuke_util import get_nuke_executable
+
+worker_script = os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), 'worker.py').replace('\\', '/')
+
+# folder that contains the package, so the workers can import it by the
+# same name as this process
+package_parent = os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))))
+
+# seconds to wait for a worker to start, nuke can take a while to get a
+# license, and for a job to finish
+start_timeout = 300
+job_timeout = 1800
+
+pool = None
+pool_lock = threading.Lock()
+
+
+class worker_error(Exception):
+    pass
+
+
+class worker():
+    def __init__(self, process, connection, pid):
+        self.process = process
+        self.connection = connection
+        self.pid = pid
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def call(self, function, data, timeout):
+        self.connection.settimeout(timeout)
+
+        send_message(self.connection, {'function': function, 'data': data})
+        return receive_message(self.connection)
+
+    def close(self):
+        try:
+            send_message(self.connection, {'quit': True})
+            self.connection.close()
+            self.process.wait(5)
+        except:
+            self.kill()
+
+    def kill(self):
+        try:
+            self.connection.close()
+        except:
+            pass
+
+        if self.is_alive():
+            self.process.kill()
+
+
+class worker_pool():
+    def __init__(self, size=2, stand_in=False, executable=''):
+        self.size = size
+        self.stand_in = stand_in
+
+        if stand_in:
+            self.executable = sys.executable
+        else:
+            self.executable = executable or get_nuke_executable()
+
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(size)
+        self.port = self.listener.getsockname()[1]
+
+        self.lock = threading.Lock()
+        self.workers = []
+        self.idle = Queue()
+        self.closed = False
+
+    def get_command(self, token):
+        if self.stand_in:
+            return [self.executable, worker_script, str(self.port), token]
+
+        return [self.executable, '-t', worker_script, str(self.port), token]
+
+    def start_worker(self):
+        token = uuid.uuid4().hex
+
+        if self.stand_in:
+            # the stand-in imports the functions from the same paths
+            paths = sys.path
+        else:
+            paths = [package_parent] + [p for p in os.environ.get(
+                'PYTHONPATH', '').split(os.pathsep) if p]
+
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join([os.path.abspath(p) for p in paths])
+
+        try:
+            process = subprocess.Popen(self.get_command(token), env=env)
+        except OSError as error:
+            raise worker_error('The worker could not be started: {}'.format(error))
+
+        deadline = time.time() + start_timeout
+        self.listener.settimeout(1)
+
+        while True:
+            if not process.poll() is None:
+                raise worker_error('The worker exited while starting: {}'.format(self.executable))
+
+            if time.time() > deadline:
+                process.kill()
+                raise worker_error('The worker did not start: {}'.format(self.executable))
+
+            try:
+                connection, _ = self.listener.accept()
+            except socket.timeout:
+                continue
+
+            try:
+                connection.settimeout(start_timeout)
+                hello = receive_message(connection)
+            except Exception:
+                connection.close()
+                continue
+
+            if hello.get('token') == token:
+                break
+
+            # not our worker
+            connection.close()
+
+        return worker(process, connection, hello.get('pid'))
+
+    def get_worker(self):
+        # an idle worker, a new one if the pool is not full, or else the
+        # first one that gets free
+        while True:
+            try:
+                _worker = self.idle.get_nowait()
+            except Empty:
+                _worker = None
+
+            if not _worker:
+                with self.lock:
+                    self.workers = [w for w in self.workers if w.is_alive()]
+
+                    if len(self.workers) < self.size:
+                        _worker = self.start_worker()
+                        self.workers.append(_worker)
+
+            if not _worker:
+                try:
+                    # with a timeout, since a busy worker that dies does not
+                    # come back to the idle queue
+                    _worker = self.idle.get(timeout=1)
+                except Empty:
+                    continue
+
+            if _worker.is_alive():
+                return _worker
+
+    def call(self, function, data, timeout=job_timeout):
+        # runs 'function(data)' on a worker and returns its result, a worker
+        # that fails or times out is killed and a new one takes its place
+        if self.closed:
+            raise worker_error('The pool is closed')
+
+        _worker = self.get_worker()
+
+        try:
+            response = _worker.call(function, data, timeout)
+        except Exception as error:
+            _worker.kill()
+            raise worker_error('The worker {} failed: {}'.format(_worker.pid, error))
+
+        self.idle.put(_worker)
+
+        output = response.get('output')
+        if output:
+            print(output.strip())
+
+        if not response.get('ok'):
+            raise worker_error(response.get('error'))
+
+        return response.get('result')
+
+    def close(self):
+        self.closed = True
+
+        with self.lock:
+            for _worker in self.workers:
+                _worker.close()
+
+            self.workers = []
+
+        self.listener.close()
+
+
+def get_pool(size=2):
+    global pool
+
+    with pool_lock:
+        if not pool:
+            pool = worker_pool(size, stand_in=bool(
+                os.environ.get('NUKE_WORKER_STAND_IN')))
+
+    return pool
+
+
+def close_pool():
+    global pool
+
+    with pool_lock:
+        if pool:
+            pool.close()
+            pool = None
+
+
+atexit.register(close_pool)
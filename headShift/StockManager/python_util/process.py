@@ -0,0 +1,138 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Jose Contreras Cuevas
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+# Runs a command from an argument list, without a shell, and waits for it
+# with a timeout and a stop function: a hung process or a stop kills it
+# instead of blocking the thread that waits for it.
+#
+# The output is read by two threads while the process runs, so a full pipe
+# never blocks it, and it can be parsed as it comes out, like the progress
+# of ffmpeg with '-progress pipe:1'.
+
+import os
+import time
+import threading
+import subprocess
+
+poll_interval = 0.2
+
+
+class process_error(Exception):
+    pass
+
+
+class process_timeout(process_error):
+    pass
+
+
+class process_cancelled(process_error):
+    pass
+
+
+def decode(data):
+    return data.decode('utf-8', 'replace')
+
+
+def read_stream(stream, lines, line_fn=None):
+    for line in iter(stream.readline, b''):
+        line = decode(line)
+        lines.append(line)
+
+        if line_fn:
+            line_fn(line.rstrip('\r\n'))
+
+    stream.close()
+
+
+def run(args, timeout=None, stop_fn=None, stdout_fn=None, stderr_fn=None, cwd=None):
+    # returns (returncode, stdout, stderr), 'stdout_fn' and 'stderr_fn' get
+    # every line as it is written. Raises 'process_timeout' after 'timeout'
+    # seconds and 'process_cancelled' when 'stop_fn()' is true, in both cases
+    # the process is killed.
+    try:
+        process = subprocess.Popen(
+            args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL, cwd=cwd)
+    except OSError as error:
+        raise process_error('{}: {}'.format(args[0], error))
+
+    out = []
+    err = []
+
+    readers = [
+        threading.Thread(target=read_stream, args=(process.stdout, out, stdout_fn)),
+        threading.Thread(target=read_stream, args=(process.stderr, err, stderr_fn))
+    ]
+
+    for reader in readers:
+        reader.daemon = True
+        reader.start()
+
+    start = time.time()
+    error = None
+
+    while True:
+        # returns as soon as the process ends, the interval only bounds how
+        # late a stop or the timeout are seen
+        try:
+            process.wait(poll_interval)
+            break
+        except subprocess.TimeoutExpired:
+            pass
+
+        if stop_fn and stop_fn():
+            error = process_cancelled('Cancelled: {}'.format(args[0]))
+
+        elif timeout and time.time() - start > timeout:
+            error = process_timeout('Timeout of {} s: {}'.format(timeout, ' '.join(args)))
+
+        if error:
+            process.kill()
+            process.wait()
+            break
+
+    for reader in readers:
+        reader.join()
+
+    if error:
+        raise error
+
+    return process.returncode, ''.join(out), ''.join(err)
+
+
+class ffmpeg_progress():
+    # parses the output of ffmpeg '-progress pipe:1 -nostats', a block of
+    # 'key=value' lines that ends with 'progress=continue' or 'progress=end',
+    # 'fn' gets every block as a dict
+    def __init__(self, fn):
+        self.fn = fn
+        self.block = {}
+
+    def __call__(self, line):
+        if not '=' in line:
+            return
+
+        key, value = line.split('=', 1)
+        self.block[key.strip()] = value.strip()
+
+        if key == 'progress':
+            block = self.block
+            self.block = {}
+            self.fn(block)
+
+
+def is_alive(pid):
+    # whether a process of this host is running, on windows it is taken as
+    # running since it can not be checked without opening the process
+    if os.name == 'nt':
+        return True
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    return True
@@ -7,28 +7,18 @@ import json
 import os
 import random
 import string
-import subprocess
 import shutil
 import base64
-from collections import OrderedDict
+import socket
+import threading
+import traceback
 
+from .process import process_cancelled
 
-def sh(cmd):
-    p = subprocess.Popen(
-        cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    out, err = p.communicate()
-
-    try:
-        out = out.decode()
-    except:
-        out = ''
-
-    try:
-        err = err.decode()
-    except:
-        err = ''
-
-    return out, err
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
 
 
 def fwrite(file, date):
@@ -46,7 +36,14 @@ def fread(file):
 
 
 def jread(file):
-    return json.loads(fread(file), object_pairs_hook=OrderedDict)
+    # the dicts keep the order of the file, like every dict since python 3.7
+    with open(file, 'rb') as f:
+        data = f.read()
+
+    if orjson:
+        return orjson.loads(data)
+
+    return json.loads(data)
 
 
 def jprint(data):
@@ -62,13 +59,105 @@ def decode(data):
     return json.loads(base64.b64decode(data.encode()).decode())
 
 
-def jwrite(file, data):
-    info = json.dumps(
-        data,
-        indent=4,
-    )
+def jdumps(data):
+    # compact JSON bytes, with orjson when it is installed
+    if orjson:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+def iter_json(data, split_items=64, top=True):
+    # compact JSON of 'data' in pieces, the top level and the dicts and lists
+    # with more than 'split_items' items are split by their items so a big
+    # file is never whole in memory, the rest is encoded at once by 'jdumps'
+    split = top or len(data) > split_items if isinstance(data, (dict, list, tuple)) else False
+
+    if split and isinstance(data, dict):
+        yield b'{'
+
+        for i, (key, value) in enumerate(data.items()):
+            if not isinstance(key, str):
+                # like json: 1 -> "1", None -> "null"
+                key = json.dumps(key)
+
+            yield (b',' if i else b'') + jdumps(key) + b':'
+
+            for piece in iter_json(value, split_items, False):
+                yield piece
+
+        yield b'}'
+
+    elif split:
+        yield b'['
+
+        for i, value in enumerate(data):
+            if i:
+                yield b','
+
+            for piece in iter_json(value, split_items, False):
+                yield piece
+
+        yield b']'
+
+    else:
+        yield jdumps(data)
+
+
+def get_tmp_path(path, ext='tmp'):
+    # temporary name next to 'path' for a file or directory that is moved to
+    # 'path' once it is complete, unique for each host, process and thread
+    return '{}.{}-{}-{}.{}'.format(path, socket.gethostname(), os.getpid(),
+                                   threading.current_thread().ident, ext)
 
-    fwrite(file, info)
+
+def get_tmp_owner(path, hosts, ext='tmp'):
+    # (host, pid) of the process that made a temporary path of 'get_tmp_path'
+    # if its host is in 'hosts', since a host name can not be told apart
+    # from the path it follows
+    if not path.endswith('.' + ext):
+        return None
+
+    try:
+        name, pid, _ = path[:-len(ext) - 1].rsplit('-', 2)
+        pid = int(pid)
+    except ValueError:
+        return None
+
+    for host in hosts:
+        if name.endswith('.' + host):
+            return host, pid
+
+    return None
+
+
+def atomic_write(file, pieces):
+    # writes the bytes of 'pieces' to a temporary file that replaces 'file'
+    # once it is complete, so a crash never leaves 'file' half written
+    tmp_file = get_tmp_path(file)
+
+    try:
+        with open(tmp_file, 'wb') as f:
+            for piece in pieces:
+                f.write(piece)
+
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_file, file)
+    except:
+        if os.path.isfile(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+
+def jwrite(file, data, compact=False):
+    # 'compact' streams the JSON without indentation, for the big files,
+    # otherwise it is indented to be edited by hand
+    if compact:
+        atomic_write(file, iter_json(data))
+    else:
+        atomic_write(file, [json.dumps(data, indent=4).encode('utf-8')])
 
 
 def hash_generator(keyLen):
@@ -135,3 +224,64 @@ def ln_tree(src, dst):
             ln_tree(srcname, dstname)
         else:
             os.link(srcname, dstname)
+
+
+def thread_pool(fn, items, workers, stop_fn=None, done_fn=None):
+    # runs 'fn(*item)' for every item on 'workers' threads, meant for jobs
+    # that wait on subprocesses (ffmpeg, ffprobe) and so release the GIL,
+    # 'done_fn(item, result)' is called from the thread that finished the job.
+    # 'items' can be a generator, the workers take the items from it as they
+    # get free, so the first jobs run while it is still producing the rest.
+    # A job whose process was killed by the stop ends quietly. An error of
+    # 'items' ends the workers and is raised once they finished their jobs.
+    if isinstance(items, (list, tuple)):
+        workers = max(1, min(workers, len(items)))
+
+    items = iter(items)
+    lock = threading.Lock()
+    items_error = []
+
+    def next_item():
+        with lock:
+            if items_error:
+                return False, None
+
+            try:
+                return True, next(items)
+            except StopIteration:
+                return False, None
+            except Exception as error:
+                items_error.append(error)
+                return False, None
+
+    def worker():
+        while True:
+            if stop_fn and stop_fn():
+                return
+
+            ok, item = next_item()
+            if not ok:
+                return
+
+            try:
+                result = fn(*item)
+            except process_cancelled:
+                continue
+            except:
+                traceback.print_exc()
+                continue
+
+            if done_fn:
+                done_fn(item, result)
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    if items_error:
+        raise items_error[0]
@@ -1 +1,4 @@
-from . import stock_manager
+from ..nuke_util.nuke_util import nuke
+
+if nuke and nuke.GUI:
+    from . import stock_manager
@@ -0,0 +1,466 @@
+# Author: Francisco Jose Contreras Cuevas
+# Office: VFX Artist - Senior Compositor
+# Website: vinavfx.com
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from ..python_util.util import jread
+
+# milliseconds a connection waits for the lock of another one, the catalog
+# is shared by the gui and the command line indexers of the farm
+busy_timeout = 30000
+
+folder_columns = [
+    ('path', 'TEXT PRIMARY KEY'),
+    ('indexed', 'INTEGER'),
+    ('amount', 'INTEGER')
+]
+
+stock_columns = [
+    ('path', 'TEXT PRIMARY KEY'),
+    ('folder', 'TEXT'),
+    ('element', 'TEXT'),
+    ('type', 'TEXT'),
+    ('name', 'TEXT'),
+    ('width', 'INTEGER'),
+    ('height', 'INTEGER'),
+    ('indexed', 'TEXT'),
+    ('passes', 'INTEGER'),
+    ('frames', 'INTEGER'),
+    ('first_frame', 'INTEGER'),
+    ('last_frame', 'INTEGER'),
+    ('is_sequence', 'INTEGER'),
+    ('fps', 'REAL'),
+    ('codec', 'TEXT'),
+    ('pix_fmt', 'TEXT'),
+    ('duration', 'REAL'),
+    ('channel_layout', 'TEXT')
+]
+
+meta_columns = [
+    ('key', 'TEXT PRIMARY KEY'),
+    ('value', 'TEXT')
+]
+
+# previews by the amount of stocks that use them, several stocks with the
+# same content share a preview. The size in bytes, the views in the player
+# and the last of them choose the previews removed when the store is over its
+# budget, an 'evicted' preview is made again when it is viewed.
+preview_columns = [
+    ('indexed', 'TEXT PRIMARY KEY'),
+    ('refs', 'INTEGER'),
+    ('size', 'INTEGER'),
+    ('views', 'INTEGER'),
+    ('last_viewed', 'REAL'),
+    ('evicted', 'INTEGER')
+]
+
+# stocks to convert, they are kept until they are done so an indexing
+# interrupted by a stop or a crash is resumed: pending, running, done, failed.
+# 'host' and 'pid' are the indexing that owns the job, it refreshes the
+# 'heartbeat' while it runs
+job_columns = [
+    ('path', 'TEXT PRIMARY KEY'),
+    ('folder', 'TEXT'),
+    ('stock', 'TEXT'),
+    ('state', 'TEXT'),
+    ('attempts', 'INTEGER'),
+    ('error', 'TEXT'),
+    ('updated', 'REAL'),
+    ('host', 'TEXT'),
+    ('pid', 'INTEGER'),
+    ('heartbeat', 'REAL')
+]
+
+stock_indexes = ['folder', 'element', 'type', 'frames', 'codec', 'indexed']
+
+# the 'refs' of the previews follow the stocks
+preview_triggers = [
+    (
+        'stocks_insert_preview', 'AFTER INSERT ON stocks',
+        'INSERT OR IGNORE INTO previews (indexed, refs) VALUES (NEW.indexed, 0);'
+        'UPDATE previews SET refs = refs + 1 WHERE indexed = NEW.indexed;'
+    ),
+    (
+        'stocks_delete_preview', 'AFTER DELETE ON stocks',
+        'UPDATE previews SET refs = refs - 1 WHERE indexed = OLD.indexed;'
+    ),
+    (
+        'stocks_update_preview', 'AFTER UPDATE OF indexed ON stocks WHEN NOT OLD.indexed IS NEW.indexed',
+        'UPDATE previews SET refs = refs - 1 WHERE indexed = OLD.indexed;'
+        'INSERT OR IGNORE INTO previews (indexed, refs) VALUES (NEW.indexed, 0);'
+        'UPDATE previews SET refs = refs + 1 WHERE indexed = NEW.indexed;'
+    )
+]
+
+
+def stock_to_row(stock):
+    width, height = stock['resolution']
+
+    row = dict(stock)
+    row['width'] = width
+    row['height'] = height
+
+    return [row.get(name) for name, _ in stock_columns]
+
+
+def row_to_stock(row):
+    stock = OrderedDict(zip([name for name, _ in stock_columns], row))
+
+    stock['resolution'] = [stock.pop('width'), stock.pop('height')]
+    stock['passes'] = bool(stock['passes'])
+    stock['is_sequence'] = bool(stock['is_sequence'])
+
+    return stock
+
+
+class catalog():
+    def __init__(self, filename):
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+
+        with self.lock:
+            # the catalog is usually in a home directory on NFS, where the
+            # shared memory of WAL does not work, so the rollback journal is
+            # used, also for the catalogs that were switched to WAL before
+            self.connection.execute('PRAGMA busy_timeout={}'.format(busy_timeout))
+            self.connection.execute('PRAGMA journal_mode=DELETE')
+
+            self.create_table('folders', folder_columns)
+            self.create_table('stocks', stock_columns)
+            self.create_table('meta', meta_columns)
+            self.create_table('jobs', job_columns)
+
+            if self.create_table('previews', preview_columns):
+                # catalogs from before the previews table
+                self.connection.execute(
+                    'INSERT INTO previews (indexed, refs) SELECT indexed, COUNT(*) FROM stocks GROUP BY indexed')
+
+            for name, event, statements in preview_triggers:
+                self.connection.execute('CREATE TRIGGER IF NOT EXISTS {} {} BEGIN {} END'.format(
+                    name, event, statements))
+
+            for column in stock_indexes:
+                self.connection.execute(
+                    'CREATE INDEX IF NOT EXISTS stocks_{0} ON stocks ({0})'.format(column))
+
+            self.connection.commit()
+
+    def create_table(self, table, columns):
+        # returns True if the table did not exist
+        exists = self.connection.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name=?", [table]).fetchone()
+
+        self.connection.execute('CREATE TABLE IF NOT EXISTS {} ({})'.format(
+            table, ', '.join(['{} {}'.format(n, t) for n, t in columns])))
+
+        # columns added in newer versions of the catalog
+        current = [r[1] for r in self.connection.execute(
+            'PRAGMA table_info({})'.format(table))]
+
+        for name, _type in columns:
+            if name in current:
+                continue
+
+            self.connection.execute('ALTER TABLE {} ADD COLUMN {} {}'.format(
+                table, name, _type.replace('PRIMARY KEY', '')))
+
+        return not exists
+
+    def get_meta(self, key):
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT value FROM meta WHERE key=?', [key]).fetchone()
+
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', [key, value])
+            self.connection.commit()
+
+    def is_empty(self):
+        with self.lock:
+            folders = self.connection.execute(
+                'SELECT COUNT(*) FROM folders').fetchone()[0]
+            stocks = self.connection.execute(
+                'SELECT COUNT(*) FROM stocks').fetchone()[0]
+
+        return not folders and not stocks
+
+    def migrate_json(self, folders_json, stocks_json):
+        # imports the old 'folders.json' and 'stocks.json' and renames them,
+        # so they are not imported again
+        folders = jread(folders_json) if os.path.isfile(folders_json) else {}
+        stocks = jread(stocks_json) if os.path.isfile(stocks_json) else {}
+
+        with self.lock:
+            for _, folder in folders.items():
+                self.upsert_folder(folder, commit=False)
+
+            self.upsert_stocks(stocks.values(), commit=False)
+            self.connection.commit()
+
+        for json_file in [folders_json, stocks_json]:
+            if os.path.isfile(json_file):
+                os.rename(json_file, json_file + '.migrated')
+
+    def get_folders(self):
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT path, indexed, amount FROM folders ORDER BY rowid').fetchall()
+
+        folders = OrderedDict()
+        for path, indexed, amount in rows:
+            folders[path] = {
+                'path': path,
+                'indexed': bool(indexed),
+                'amount': amount
+            }
+
+        return folders
+
+    def upsert_folder(self, folder, commit=True):
+        values = [folder['indexed'], folder['amount'], folder['path']]
+
+        with self.lock:
+            cursor = self.connection.execute(
+                'UPDATE folders SET indexed=?, amount=? WHERE path=?', values)
+
+            if not cursor.rowcount:
+                self.connection.execute(
+                    'INSERT INTO folders (indexed, amount, path) VALUES (?, ?, ?)', values)
+
+            if commit:
+                self.connection.commit()
+
+    def upsert_folders(self, folders):
+        with self.lock:
+            for folder in folders:
+                self.upsert_folder(folder, commit=False)
+
+            self.connection.commit()
+
+    def delete_folder(self, path):
+        with self.lock:
+            self.connection.execute('DELETE FROM folders WHERE path=?', [path])
+            self.connection.execute('DELETE FROM jobs WHERE folder=?', [path])
+            self.connection.commit()
+
+    def count_stocks(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM stocks').fetchone()[0]
+
+    def get_stock_pages(self, page_size):
+        # yields the stocks in pages of 'page_size', in the order they were
+        # added, each page starts after the rowid of the previous one
+        names = ', '.join([n for n, _ in stock_columns])
+        last_rowid = 0
+
+        while True:
+            with self.lock:
+                rows = self.connection.execute(
+                    'SELECT rowid, {} FROM stocks WHERE rowid > ? ORDER BY rowid LIMIT ?'.format(names),
+                    [last_rowid, page_size]).fetchall()
+
+            if not rows:
+                return
+
+            last_rowid = rows[-1][0]
+
+            stocks = OrderedDict()
+            for row in rows:
+                stock = row_to_stock(row[1:])
+                stocks[stock['path']] = stock
+
+            yield stocks
+
+    def upsert_stock(self, stock, commit=True):
+        # an UPDATE before the INSERT keeps the rowid, and so the order of the
+        # stocks, which 'INSERT OR REPLACE' would change
+        row = stock_to_row(stock)
+        names = [n for n, _ in stock_columns]
+
+        with self.lock:
+            cursor = self.connection.execute('UPDATE stocks SET {} WHERE path=?'.format(
+                ', '.join(['{}=?'.format(n) for n in names[1:]])), row[1:] + row[:1])
+
+            if not cursor.rowcount:
+                self.connection.execute('INSERT INTO stocks ({}) VALUES ({})'.format(
+                    ', '.join(names), ', '.join(['?'] * len(names))), row)
+
+            if commit:
+                self.connection.commit()
+
+    def upsert_stocks(self, stocks, commit=True):
+        with self.lock:
+            for stock in stocks:
+                self.upsert_stock(stock, commit=False)
+
+            if commit:
+                self.connection.commit()
+
+    def delete_stocks(self, paths):
+        with self.lock:
+            self.connection.executemany(
+                'DELETE FROM stocks WHERE path=?', [[p] for p in paths])
+            self.connection.commit()
+
+    def get_previews(self):
+        with self.lock:
+            rows = self.connection.execute('SELECT indexed FROM previews').fetchall()
+
+        return [r[0] for r in rows]
+
+    def pop_unreferenced_previews(self):
+        # removes the previews that no stock uses and returns them
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT indexed FROM previews WHERE refs <= 0').fetchall()
+
+            self.connection.execute('DELETE FROM previews WHERE refs <= 0')
+            self.connection.commit()
+
+        return [r[0] for r in rows]
+
+    def delete_previews(self, previews):
+        with self.lock:
+            self.connection.executemany(
+                'DELETE FROM previews WHERE indexed=?', [[p] for p in previews])
+            self.connection.commit()
+
+    def get_unmeasured_previews(self):
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT indexed FROM previews WHERE size IS NULL AND NOT evicted IS 1').fetchall()
+
+        return [r[0] for r in rows]
+
+    def set_preview_size(self, indexed, size, commit=True):
+        # a None size is measured later, the preview is on disk again
+        with self.lock:
+            self.connection.execute(
+                'UPDATE previews SET size=?, evicted=0 WHERE indexed=?', [size, indexed])
+
+            if commit:
+                self.connection.commit()
+
+    def set_preview_sizes(self, sizes):
+        # [[indexed, size]]
+        with self.lock:
+            self.connection.executemany(
+                'UPDATE previews SET size=? WHERE indexed=?', [[size, indexed] for indexed, size in sizes])
+            self.connection.commit()
+
+    def set_preview_viewed(self, indexed):
+        with self.lock:
+            self.connection.execute(
+                'UPDATE previews SET views=COALESCE(views, 0) + 1, last_viewed=? WHERE indexed=?',
+                [time.time(), indexed])
+            self.connection.commit()
+
+    def set_preview_evicted(self, indexed):
+        with self.lock:
+            self.connection.execute(
+                'UPDATE previews SET evicted=1, size=0 WHERE indexed=?', [indexed])
+            self.connection.commit()
+
+    def is_evicted(self, indexed):
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT evicted FROM previews WHERE indexed=?', [indexed]).fetchone()
+
+        return bool(row and row[0])
+
+    def get_store_size(self):
+        # bytes of the previews on disk
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT SUM(size) FROM previews WHERE NOT evicted IS 1').fetchone()
+
+        return row[0] or 0
+
+    def get_eviction_order(self):
+        # [indexed, size] of the previews on disk, the least recently viewed
+        # first and the least viewed first among the never viewed ones
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT indexed, size FROM previews WHERE refs > 0 AND NOT evicted IS 1 '
+                'ORDER BY COALESCE(last_viewed, 0), COALESCE(views, 0), rowid').fetchall()
+
+        return [[indexed, size or 0] for indexed, size in rows]
+
+    def add_job(self, folder, stock, host, pid):
+        # 'stock' is the stock found by the crawl: [path, first_frame,
+        # last_frame, frames, is_sequence], the attempts are kept
+        now = time.time()
+        values = [folder, json.dumps(stock), 'pending', now, host, pid, now, stock[0]]
+
+        with self.lock:
+            cursor = self.connection.execute(
+                'UPDATE jobs SET folder=?, stock=?, state=?, updated=?, host=?, pid=?, heartbeat=? WHERE path=?',
+                values)
+
+            if not cursor.rowcount:
+                self.connection.execute(
+                    'INSERT INTO jobs (folder, stock, state, updated, host, pid, heartbeat, path, attempts, error) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', values + [0, ''])
+
+            self.connection.commit()
+
+    def claim_jobs(self, paths, host, pid):
+        # the jobs of a stopped or crashed indexing, taken by a new one
+        now = time.time()
+
+        with self.lock:
+            self.connection.executemany(
+                'UPDATE jobs SET host=?, pid=?, heartbeat=? WHERE path=?',
+                [[host, pid, now, path] for path in paths])
+            self.connection.commit()
+
+    def touch_jobs(self, host, pid):
+        with self.lock:
+            self.connection.execute(
+                "UPDATE jobs SET heartbeat=? WHERE host=? AND pid=? AND state IN ('pending', 'running')",
+                [time.time(), host, pid])
+            self.connection.commit()
+
+    def set_job_state(self, path, state, error=''):
+        attempts = 1 if state == 'running' else 0
+
+        with self.lock:
+            self.connection.execute(
+                'UPDATE jobs SET state=?, error=?, updated=?, attempts=attempts+? WHERE path=?',
+                [state, error, time.time(), attempts, path])
+            self.connection.commit()
+
+    def get_jobs(self, states, max_attempts=-1):
+        # returns [folder, stock, host, pid, heartbeat] of the jobs in
+        # 'states', in the order they were added, with 'max_attempts' only
+        # the ones started fewer times
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT folder, stock, host, pid, heartbeat, attempts FROM jobs WHERE state IN ({}) '
+                'ORDER BY rowid'.format(', '.join(['?'] * len(states))), states).fetchall()
+
+        return [[folder, json.loads(stock), host, pid, heartbeat]
+                for folder, stock, host, pid, heartbeat, attempts in rows
+                if max_attempts < 0 or attempts < max_attempts]
+
+    def delete_jobs(self, states):
+        with self.lock:
+            self.connection.execute('DELETE FROM jobs WHERE state IN ({})'.format(
+                ', '.join(['?'] * len(states))), states)
+            self.connection.commit()
+
+    def delete_unknown_jobs(self):
+        # jobs of folders that are not connected anymore
+        with self.lock:
+            self.connection.execute(
+                'DELETE FROM jobs WHERE NOT folder IN (SELECT path FROM folders)')
+            self.connection.commit()
@@ -2,14 +2,28 @@
 # Office: VFX Artist - Senior Compositor
 # Website: vinavfx.com
 import os
+import json
 import platform
-import subprocess
-import nuke
+import shutil
 
-from ..nuke_util.media_util import get_name_no_extension, get_extension, is_sequence, get_sequence
-from ..python_util.util import sh
+from sequence_util.sequence import get_frame_path
+
+from ..nuke_util.media_util import get_name_no_extension, get_extension, is_sequence
+from ..python_util import process
+from ..python_util.util import get_tmp_path
+from ..python_util.process import ffmpeg_progress
 from ..nuke_util.func_exec import exec_function
-from ..nuke_util.nuke_util import get_nuke_path
+from ..nuke_util.worker_pool import job_timeout
+from ..nuke_util.nuke_util import get_nuke_path, get_nuke_executable, nuke
+from . import preview_pack
+
+# functions run by the nuke workers, by the path this module is imported
+# from, since the worker imports it instead of using the GUI aliases
+nuke_convert_function = '{}.convert_with_nuke'.format(__name__)
+nuke_batch_function = '{}.convert_with_nuke_batch'.format(__name__)
+
+# frames of the longest preview, the rest of the stock is not converted
+max_preview_frames = 360
 
 
 def get_correct_sequence(sequence):
@@ -25,6 +39,11 @@ def get_correct_sequence(sequence):
     return new_sequence
 
 
+def get_preview_frames(first_frame, last_frame):
+    total_frames = last_frame - first_frame
+    return max_preview_frames if total_frames > max_preview_frames else total_frames
+
+
 def get_ffmpeg():
     if platform.system() == "Linux":
         ffmpeg = '/usr/bin/ffmpeg'
@@ -43,7 +62,14 @@ def get_ffmpeg():
     return ffmpeg, ffprobe
 
 
-def convert(src_hash, dst, first_frame, last_frame, is_sequence, is_texture):
+def convert(src_hash, dst, first_frame, last_frame, is_sequence, is_texture, thumbnails_dir=None, packed=False, preview_name=None, nuke_jobs=None,
+            stop_fn=None, timeout=None, progress_fn=None):
+    # 'preview_name' is the name of the preview in 'dst', by default it is
+    # '<parent directory>_<name>'. When ffmpeg can not convert the stock and
+    # 'nuke_jobs' is a list, the conversion is added to it to be done later
+    # with 'convert_batch_with_nuke', otherwise it is done now with nuke.
+    # ffmpeg is killed when 'stop_fn()' is true or after 'timeout' seconds,
+    # 'progress_fn' gets the progress blocks of ffmpeg.
 
     ffmpeg, _ = get_ffmpeg()
 
@@ -56,129 +82,297 @@ def convert(src_hash, dst, first_frame, last_frame, is_sequence, is_texture):
         src = get_correct_sequence(src)
         name = name.replace('#', '')[:-1]
 
-    output_dir = '{}/{}_{}'.format(dst,
-                                   os.path.basename(os.path.dirname(src)), name)
+    if not preview_name:
+        preview_name = '{}_{}'.format(os.path.basename(os.path.dirname(src)), name)
+
+    output_dir = '{}/{}'.format(dst, preview_name)
+
+    pack_file = '{}.{}'.format(output_dir, preview_pack.extension)
+
+    if os.path.isfile(pack_file):
+        return name, pack_file
 
     if os.path.isdir(output_dir):
         return name, output_dir
 
-    os.mkdir(output_dir)
+    # the preview is written to a temporary directory that is renamed when it
+    # is complete, so a stop or a crash never leaves a partial preview
+    tmp_dir = get_tmp_path(output_dir)
 
-    output = '{}/{}_%d.jpg'.format(output_dir, name)
+    if os.path.isdir(tmp_dir):
+        shutil.rmtree(tmp_dir)
 
-    total_frames = last_frame - first_frame
-    frames = 360 if total_frames > 360 else total_frames
+    os.mkdir(tmp_dir)
+
+    # the frames are named the same for every stock, since the stocks with
+    # the same content share the preview
+    output = '{}/frame_%d.jpg'.format(tmp_dir)
+
+    frames = get_preview_frames(first_frame, last_frame)
     scale = 400
+    thumbnail_scale = 120
 
     if is_texture:
-        cmd = '{} -i "{}" -vf scale={}:-1 -q:v 1 "{}/{}.jpg"'.format(
-            ffmpeg, src, scale, output_dir, basename)
+        input_args = ['-i', src]
+        output_args = ['-q:v', '1', '{}/frame.jpg'.format(tmp_dir)]
+        thumbnail_frame = 0
+
+    else:
+        start_number = ['-start_number', str(first_frame)] if is_sequence else []
+
+        input_args = start_number + ['-i', src]
+        output_args = ['-q:v', '1', '-frames:v', str(frames), output]
+        thumbnail_frame = int(frames / 2)
+
+    cmd = [ffmpeg]
+
+    if progress_fn:
+        cmd += ['-progress', 'pipe:1', '-nostats']
+
+    thumbnail = tmp_thumbnail = ''
+
+    if thumbnails_dir:
+        # the preview frames and the thumbnail (the middle frame) come out of
+        # the same decode, so the preview is not read again for the thumbnail
+        thumbnail = '{}/{}.jpg'.format(thumbnails_dir,
+                                       os.path.basename(output_dir))
+        tmp_thumbnail = '{}.tmp.jpg'.format(os.path.basename(tmp_dir))
+        tmp_thumbnail = '{}/{}'.format(thumbnails_dir, tmp_thumbnail)
 
-    elif is_sequence:
-        cmd = '{} -start_number {} -i "{}" -vf scale={}:-1 -q:v 1 -vframes {} "{}"'.format(
-            ffmpeg, first_frame, src, scale, frames, output)
+        filters = (
+            '[0:v]scale={}:-1,split=2[preview][thumb];'
+            '[thumb]select=eq(n\\,{}),scale={}:-1[thumbnail]'
+        ).format(scale, thumbnail_frame, thumbnail_scale)
+
+        cmd += input_args + ['-filter_complex', filters, '-map', '[preview]'] + output_args
+        cmd += ['-map', '[thumbnail]', '-frames:v', '1', '-q:v', '1', tmp_thumbnail]
 
     else:
-        seconds = frames / 24
-        cmd = '{} -i "{}" -vf scale={}:-1 -q:v 1 -ss 0 -t {} "{}"'.format(
-            ffmpeg, src, scale, seconds, output)
+        cmd += input_args + ['-vf', 'scale={}:-1'.format(scale)] + output_args
+
+    try:
+        _, _, stderr = process.run(cmd, timeout, stop_fn,
+                                   ffmpeg_progress(progress_fn) if progress_fn else None)
+    except process.process_error:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        if tmp_thumbnail and os.path.isfile(tmp_thumbnail):
+            os.remove(tmp_thumbnail)
+
+        raise
+
+    ffmpeg_error = 'Error' in stderr
+
+    convert_data = {
+        'src': src_hash,
+        'output': output,
+        'first_frame': first_frame,
+        'last_frame': last_frame,
+        'scale': scale,
+        'frames': frames,
+        'tmp_dir': tmp_dir,
+        'output_dir': output_dir,
+        'pack_file': pack_file if packed else '',
+        'tmp_thumbnail': tmp_thumbnail,
+        'thumbnail': thumbnail
+    }
+
+    if ffmpeg_error and get_nuke_executable():
+        if not nuke_jobs is None:
+            nuke_jobs.append(convert_data)
+            return name, pack_file if packed else output_dir
+
+        exec_function(nuke_convert_function, convert_data, timeout)
+
+    return name, finish_preview(convert_data)
+
+
+def finish_preview(data):
+    # moves the converted preview from its temporary directory to its place
+    tmp_dir = data['tmp_dir']
+    output_dir = data['output_dir']
+
+    if not os.path.isdir(tmp_dir) or not os.listdir(tmp_dir):
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return output_dir
+
+    if data['tmp_thumbnail'] and os.path.isfile(data['tmp_thumbnail']):
+        os.rename(data['tmp_thumbnail'], data['thumbnail'])
+
+    if data['pack_file']:
+        return preview_pack.pack(tmp_dir, data['pack_file'])
+
+    try:
+        os.rename(tmp_dir, output_dir)
+    except OSError:
+        # another indexing worker finished the same preview first
+        shutil.rmtree(tmp_dir)
+
+    return output_dir
 
-    _, stdout = sh(cmd)
-    ffmpeg_error = 'Error' in stdout
 
-    if ffmpeg_error:
-        convert_data = {
-            'src': src_hash,
-            'output': output,
-            'first_frame': first_frame,
-            'last_frame': last_frame,
-            'scale': scale,
-            'frames': frames
-        }
+def convert_batch_with_nuke(jobs, timeout=None):
+    # converts with a nuke worker the 'nuke_jobs' left by 'convert', and
+    # returns the result of each one: {'ok': bool, 'error': str}. 'timeout'
+    # is the seconds for each stock, by default the 'job_timeout' of the pool
+    results = exec_function(nuke_batch_function, {'items': jobs},
+                            (timeout or job_timeout) * len(jobs))
 
-        exec_function(
-            'stock_manager.stock_manager.converter.convert_with_nuke', convert_data)
+    if not isinstance(results, list) or not len(results) == len(jobs):
+        results = [{'ok': False, 'error': 'The nuke worker failed'}] * len(jobs)
 
-    return name, output_dir
+    for job in jobs:
+        finish_preview(job)
+
+    return results
 
 
 def convert_with_nuke(data):
-    src = data['src']
-    output = data['output']
-    first_frame = data['first_frame']
-    last_frame = data['last_frame']
-    scale = data['scale']
-    frames = data['frames']
+    return convert_with_nuke_batch({'items': [data]})[0]
+
 
+def convert_with_nuke_batch(data):
+    # runs inside nuke, a single Read -> Reformat -> Write chain is used for
+    # all the items, only its knobs change from one item to the next
     read = nuke.createNode('Read')
-    read.knob('file').fromUserText(src)
-    read.knob('first').setValue(first_frame)
-    read.knob('last').setValue(last_frame)
 
     reformat = nuke.createNode('Reformat')
     reformat.knob('type').setValue('to box')
-    reformat.knob('box_width').setValue(scale)
     reformat.setInput(0, read)
 
     write = nuke.createNode('Write')
     write.setInput(0, reformat)
-    write.knob('file').setValue(output)
     write.knob('file_type').setValue('jpeg')
 
-    nuke.execute(write, first_frame, first_frame +
-                 frames, continueOnError=True)
+    results = []
 
+    for item in data['items']:
+        first_frame = item['first_frame']
+        tmp_dir = item['tmp_dir']
 
-def get_frames(video):
-    _, ffprobe = get_ffmpeg()
+        try:
+            # the frames that ffmpeg wrote before it failed
+            for f in os.listdir(tmp_dir):
+                os.remove(os.path.join(tmp_dir, f))
+
+            read.knob('file').fromUserText(item['src'])
+            read.knob('first').setValue(first_frame)
+            read.knob('last').setValue(item['last_frame'])
 
-    cmd = [ffprobe, '-show_entries', 'stream=nb_frames', '-i', video]
-    process = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+            reformat.knob('box_width').setValue(item['scale'])
+            write.knob('file').setValue(item['output'])
 
-    out, _ = process.communicate()
-    out = out.decode().split('nb_frames=')[1].split()[0]
+            nuke.execute(write, first_frame, first_frame +
+                         item['frames'], continueOnError=True)
 
-    return int(out)
+            # with 'continueOnError' it returns even if no frame was read
+            if not os.listdir(tmp_dir):
+                results.append({'ok': False, 'error': 'No frame was written'})
+                continue
 
+            results.append({'ok': True, 'error': ''})
 
-def get_format(video, start_frame):
+        except Exception as error:
+            results.append({'ok': False, 'error': str(error)})
+
+    return results
+
+
+def get_rate(rate):
+    try:
+        num, den = rate.split('/')
+        return round(float(num) / float(den), 3)
+    except:
+        return 0.0
+
+
+def probe(video, start_frame=1, stop_fn=None, timeout=None):
+    # a single ffprobe call that returns all the metadata of the stock
     is_seq = is_sequence(video)
 
     if is_seq:
         video = get_correct_sequence(video)
 
-    start_number = '-start_number {}'.format(start_frame) if is_seq else ''
-
     _, ffprobe = get_ffmpeg()
 
-    cmd = '{} {} -show_entries stream=width,height -i "{}"'.format(
-        ffprobe, start_number, video)
+    cmd = [ffprobe, '-v', 'error', '-print_format', 'json',
+           '-show_streams', '-show_format']
+
+    if is_seq:
+        cmd += ['-start_number', str(start_frame)]
+
+    cmd += ['-i', video]
+
+    _, out, _ = process.run(cmd, timeout, stop_fn)
+
+    try:
+        info = json.loads(out)
+    except ValueError:
+        info = {}
 
-    out, _ = sh(cmd)
+    video_stream = {}
+    audio_stream = {}
 
+    for stream in info.get('streams', []):
+        codec_type = stream.get('codec_type')
+
+        if codec_type == 'video' and not video_stream:
+            video_stream = stream
+        elif codec_type == 'audio' and not audio_stream:
+            audio_stream = stream
+
+    _format = info.get('format', {})
+
+    fps = get_rate(video_stream.get('r_frame_rate', ''))
+    if not fps:
+        fps = get_rate(video_stream.get('avg_frame_rate', ''))
+
+    duration = float(video_stream.get(
+        'duration', _format.get('duration', 0)) or 0)
+
+    frames = int(video_stream.get('nb_frames', 0) or 0)
+    if not frames and duration and fps:
+        frames = int(round(duration * fps))
+
+    metadata = {
+        'frames': frames,
+        'width': int(video_stream.get('width', 0) or 0),
+        'height': int(video_stream.get('height', 0) or 0),
+        'fps': fps,
+        'codec': video_stream.get('codec_name', ''),
+        'pix_fmt': video_stream.get('pix_fmt', ''),
+        'duration': duration,
+        'channel_layout': audio_stream.get('channel_layout', '')
+    }
+
+    if not metadata['width'] or not metadata['height']:
+        metadata['width'], metadata['height'] = identify_format(
+            get_frame_path(video, start_frame) if is_seq else video, timeout)
+
+    return metadata
+
+
+def identify_format(image, timeout=None):
+    # ImageMagick fallback for images that ffprobe cannot read
     width = 0
     height = 0
 
+    image_magick = '/usr/bin/identify'
+    cmd = [image_magick, '-format', '%wx%h', image]
+
     try:
-        width = int(out.split('width=')[1].split()[0])
-        height = int(out.split('height=')[1].split()[0])
+        _, out, _ = process.run(cmd, timeout)
+    except process.process_error as error:
+        out = ''
+        print(error)
+
+    try:
+        width = int(out.split('x')[0])
+        height = int(out.split('x')[1])
     except:
         pass
 
-    if not width or not height:
-        image_magick = '/usr/bin/identify'
-        one_frame = get_sequence(video)[0]
-        cmd = '{} -format "%wx%h" "{}"'.format(image_magick, one_frame)
-        out, _ = sh(cmd)
-
-        try:
-            width = int(out.split('x')[0])
-            height = int(out.split('x')[1])
-        except:
-            pass
-
     if not width or not height:
         print('Error: Format cannot be 0 !', cmd)
 
     return width, height
-
@@ -3,15 +3,77 @@
 # Website: vinavfx.com
 
 import os
+import errno
+import socket
+import hashlib
 import shutil
-import nuke
+import time
+import threading
+import multiprocessing
+from collections import OrderedDict
 
-from ..python_util.util import jread, jwrite
+from sequence_util import sequence
+from sequence_util.sequence_cache import mtime_resolution
+
+from ..python_util.util import jread, jwrite, thread_pool, get_tmp_owner
+from ..python_util import process
 from . import converter
+from . import preview_pack
+from .catalog import catalog
+from .search_index import search_index
+from .tagger import tagger
 from ..nuke_util.nuke_util import get_nuke_path
-from ..nuke_util.media_util import get_extension, get_sequence
 
 data = {}
+manifest = {}
+db = None
+search = search_index()
+element_tagger = None
+type_tagger = None
+
+video_extensions = set(['mov', 'mp4'])
+image_extensions = set(['jpg', 'jpeg', 'tiff', 'tif', 'png', 'exr'])
+
+# seconds between the saves of the manifest and the folders while indexing,
+# the indexed stocks and the jobs are saved as they finish
+checkpoint_interval = 60
+
+# the jobs belong to the indexing that journaled them, it refreshes their
+# heartbeat while it runs, so the jobs of an indexing still running in
+# another process, or on another host sharing the catalog, are not resumed
+job_host = socket.gethostname()
+job_heartbeat_interval = 30
+job_heartbeat_timeout = 120
+
+# times a job is started before it is not resumed anymore, so a stock that
+# crashes nuke or its indexing is not resumed on every launch, it is still
+# indexed again by a refresh
+max_job_attempts = 3
+
+# stocks that ffmpeg can not read are converted by the nuke workers, this
+# amount of stocks each time
+nuke_batch_size = 20
+nuke_workers = 2
+
+# seconds between the progress updates of each stock being converted, the
+# last one is always sent, the gui shows them once each interval
+progress_interval = 0.25
+
+# bytes read from each sample of a file for its fingerprint
+fingerprint_sample_size = 65536
+
+# sizes of the thumbnails made on demand for the views, each view loads the
+# smallest one that fills its icons, the thumbnail made by the indexing is
+# 'thumbnail_width' wide
+thumbnail_tiers = [64, 128, 256]
+thumbnail_width = 120
+
+# stocks loaded before the panel opens, the rest of the catalog is loaded
+# in the background in pages of this size
+catalog_page_size = 5000
+
+# image sequences shorter than this are indexed as textures
+min_sequence_frames = 24
 
 stock_elements = [
     'atmosphere', 'blood', 'charge', 'couch', 'debris', 'lightbulb', 'cement', 'rock', 'wood', 'dust',
@@ -36,63 +98,155 @@ stock_types = [
     'rough', 'studded', 'cloudy', 'fuming', 'roar', 'beautiful', 'staringat', 'dying', 'stream'
 ]
 
-stock_manager_folder = '{}/stock_manager_indexing'.format(get_nuke_path())
+# the catalog, previews and settings, by default in the .nuke of the user.
+# 'STOCK_MANAGER_DATA' points the gui and the command line indexer to the
+# same folder when they run as different users, like on a render farm
+data_folder_env = 'STOCK_MANAGER_DATA'
+
+stock_manager_folder = (os.environ.get(data_folder_env) or '{}/stock_manager_indexing'.format(
+    get_nuke_path())).replace('\\', '/').rstrip('/')
 
 index_folder = stock_manager_folder + '/indexed'
 thumbnails_folder = stock_manager_folder + '/thumbnails'
+catalog_data = stock_manager_folder + '/catalog.db'
 folders_data = stock_manager_folder + '/folders.json'
 stocks_data = stock_manager_folder + '/stocks.json'
+settings_data = stock_manager_folder + '/settings.json'
+manifest_data = stock_manager_folder + '/manifest.json'
+tags_data = stock_manager_folder + '/tags.json'
 indexing = False
+restore_lock = threading.Lock()
+
+# set once all the stocks and the manifest are loaded
+stocks_loaded = threading.Event()
+stock_pages = iter([])
+
+default_settings = {
+    'jobs': max(1, multiprocessing.cpu_count() - 1),
+    'packed_previews': False,
+    'player_cache_mb': 512,
+    'player_prefetch': 24,
+    'process_timeout': 1800,
+    # megabytes of previews kept on disk, the least recently viewed are
+    # removed over it and made again when they are viewed, 0 keeps all
+    'preview_cache_mb': 0
+}
+settings = default_settings.copy()
 
 if not os.path.isdir(index_folder):
     os.makedirs(index_folder)
 
-if not os.path.isdir(thumbnails_folder):
-    os.makedirs(thumbnails_folder)
+for tier in thumbnail_tiers:
+    tier_folder = '{}/{}'.format(thumbnails_folder, tier)
+    if not os.path.isdir(tier_folder):
+        os.makedirs(tier_folder)
 
 
-def load_data():
-    global data
+def load_data(lazy=False):
+    # 'lazy' only loads the first page of stocks, the rest are loaded by
+    # 'load_remaining_stocks'
+    global data, db, stock_pages
 
     if not os.path.isdir(stock_manager_folder):
         os.mkdir(stock_manager_folder)
 
-    if os.path.isfile(folders_data):
-        folders = jread(folders_data)
-    else:
-        folders = {}
-        jwrite(folders_data, folders)
+    if not db:
+        db = catalog(catalog_data)
 
-    if os.path.isfile(stocks_data):
-        stocks = jread(stocks_data)
-    else:
-        stocks = {}
-        jwrite(stocks_data, stocks)
+    if db.is_empty() and (os.path.isfile(folders_data) or os.path.isfile(stocks_data)):
+        db.migrate_json(folders_data, stocks_data)
+
+    db.delete_unknown_jobs()
+
+    stocks_loaded.clear()
 
     data = {
-        'folders': folders,
-        'stocks': stocks
+        'folders': db.get_folders(),
+        'stocks': OrderedDict()
     }
 
+    search.clear()
+    stock_pages = db.get_stock_pages(catalog_page_size)
+
+    if lazy:
+        add_stocks(next(stock_pages, {}))
+    else:
+        load_remaining_stocks()
+
+    load_settings()
+    load_tags()
+
+
+def add_stocks(stocks):
+    for path, stock in stocks.items():
+        data['stocks'][path] = stock
+        search.add(stock)
+
+
+def load_remaining_stocks(page_fn=None):
+    # the stocks after the first page and the manifest, 'page_fn(loaded,
+    # total)' is called after each page
+    global manifest
+
+    total = db.count_stocks()
+
+    for stocks in stock_pages:
+        add_stocks(stocks)
+
+        if page_fn:
+            page_fn(len(data['stocks']), total)
+
+    manifest = jread(manifest_data) if os.path.isfile(manifest_data) else {}
+    stocks_loaded.set()
+
+
+def is_loaded():
+    return stocks_loaded.is_set()
+
+
+def load_settings():
+    settings.update(default_settings)
+
+    if os.path.isfile(settings_data):
+        settings.update(jread(settings_data))
+    else:
+        jwrite(settings_data, settings)
+
+
+def get_setting(key):
+    return settings.get(key, default_settings.get(key))
+
+
+def load_tags():
+    # 'tags.json' extends the elements and types with the user tags:
+    # {"elements": [...], "types": [...]}
+    global element_tagger, type_tagger
+
+    user_tags = jread(tags_data) if os.path.isfile(tags_data) else {}
+
+    element_tagger = tagger(stock_elements + user_tags.get('elements', []))
+    type_tagger = tagger(stock_types + user_tags.get('types', []))
 
-def save_data():
-    global data
 
-    new_data = {}
-    new_data['folders'] = data['folders']
-    new_data['stocks'] = {}
+def get_tags_signature():
+    tags = '\n'.join(element_tagger.tags) + '\n\n' + '\n'.join(type_tagger.tags)
+    return hashlib.md5(tags.encode()).hexdigest()
 
-    for key, stock in data['stocks'].items():
-        _stock = stock.copy()
 
-        for k in ['item', 'mounted', 'hide']:
-            if k in _stock:
-                del _stock[k]
+def save_folders():
+    db.upsert_folders(data['folders'].values())
 
-        new_data['stocks'][key] = _stock
 
-    jwrite(stocks_data, new_data['stocks'])
-    jwrite(folders_data, new_data['folders'])
+def save_manifest():
+    jwrite(manifest_data, manifest, compact=True)
+
+
+def query_stocks(limit=-1, **filters):
+    return search.query(limit, **filters)
+
+
+def get_facet_counts(column, **filters):
+    return search.facet_counts(column, **filters)
 
 
 def get_indexed_folder():
@@ -115,135 +269,608 @@ def is_indexing():
     return indexing
 
 
-def to_index(finished_fn, each_folder_fn, each_fn, stop_threads):
+def get_index_state(stock, changed):
+    # 'new', 'no_preview' and 'new_range' stocks have to be indexed
+    indexed = data['stocks'].get(stock[0])
+
+    if not indexed:
+        return 'new'
+
+    if not changed:
+        # the directory is unchanged since the last index
+        return 'indexed'
+
+    if not preview_exists(indexed['indexed']) and not db.is_evicted(indexed['indexed']):
+        return 'no_preview'
+
+    if not [indexed['first_frame'], indexed['last_frame']] == stock[1:3] and stock[4]:
+        return 'new_range'
+
+    return 'indexed'
+
+
+def must_index(stock, changed):
+    # a stock with a new frame range gets a new preview, the old one is
+    # removed by 'garbage_remove' once no stock uses it
+    if get_index_state(stock, changed) == 'indexed':
+        # the stocks of unchanged directories are not touched on disk
+        if changed:
+            create_thumbnail(data['stocks'][stock[0]]['indexed'])
+        return False
+
+    return True
+
+
+def is_job_owned(host, pid, heartbeat):
+    # True if the job belongs to an indexing of another process that is
+    # still running
+    if host == job_host and pid == os.getpid():
+        return False
+
+    if not heartbeat or time.time() - heartbeat > job_heartbeat_timeout:
+        return False
+
+    if host == job_host:
+        return process.is_alive(pid)
+
+    return True
+
+
+def get_unfinished_jobs():
+    # [folder, stock] of the jobs left by an indexing that was stopped or
+    # crashed, and the paths of the jobs owned by a running indexing
+    jobs = []
+    owned = set()
+
+    resumable = set([stock[0] for _, stock, _, _, _ in
+                     db.get_jobs(['pending', 'running'], max_job_attempts)])
+
+    for folder, stock, host, pid, heartbeat in db.get_jobs(['pending', 'running']):
+        if is_job_owned(host, pid, heartbeat):
+            owned.add(stock[0])
+        elif stock[0] in resumable:
+            jobs.append([folder, stock])
+
+    return jobs, owned
+
+
+def has_unfinished_jobs():
+    return bool(get_unfinished_jobs()[0])
+
+
+def get_job_owners():
+    # (host, pid) of the indexings of other processes that are running
+    return set([(host, pid) for _, _, host, pid, heartbeat in db.get_jobs(['pending', 'running'])
+                if is_job_owned(host, pid, heartbeat)])
+
+
+def is_tmp_owned(name, owners):
+    # True if a temporary file of the index folder belongs to a process that
+    # is still running, this one included
+    owner = get_tmp_owner(name, [job_host] + [host for host, _ in owners])
+
+    if not owner:
+        return False
+
+    host, pid = owner
+
+    if host == job_host:
+        return process.is_alive(pid)
+
+    return owner in owners
+
+
+def to_index(finished_fn, each_folder_fn, each_fn, stop_threads, folders=None, progress_fn=None):
+    # 'folders' limits the indexing to some of the connected folders,
+    # 'progress_fn' gets the progress of the stocks while they are converted
     global indexing
     indexing = True
 
-    refresh_indexs()
+    # the catalog may still be loading in the background
+    stocks_loaded.wait()
 
-    total_stocks = 0
+    if folders is None:
+        folders = get_indexed_folder()
+    else:
+        folders = dict([(f, get_indexed_folder()[f]) for f in folders])
 
-    folders = []
-    for folder, folder_data in get_indexed_folder().items():
-        stocks = []
-        for stock in get_stocks_from_folder(folder):
-            path = stock[0]
-            is_sequence = stock[4]
+    lock = threading.Lock()
 
-            will_index = False
+    found = set()
+    incomplete = set()
+    queued = set()
+    deferred = set()
+    nuke_jobs = []
+    crawled = set()
+    finished = set()
 
-            if not path in data['stocks']:
-                will_index = True
-            elif not os.path.isdir(data['stocks'][path]['indexed']):
-                will_index = True
-            elif not os.listdir(data['stocks'][path]['indexed']):
-                will_index = True
+    # the total is the amount of stocks found so far, since the crawl goes
+    # on while the first stocks are being converted
+    general_stocks = [0, 0]
 
-            if not is_sequence:
-                if os.path.getsize(path) < 10000:
-                    continue
+    pending = {}
+    indexed_by_folder = {}
 
-            if will_index:
-                stocks.append(stock)
-            else:
-                create_thumbnail(data['stocks'][path]['indexed'])
+    for folder, folder_data in folders.items():
+        indexed_by_folder[folder] = folder_data['amount']
+        pending[folder] = 0
 
-        total_stocks += len(stocks)
+    started_amount = dict(indexed_by_folder)
 
-        folders.append([folder, folder_data, stocks])
+    def finish_folder(folder):
+        finished.add(folder)
+        each_folder_fn(folder, indexed_by_folder[folder])
+        data['folders'][folder]['indexed'] = True
 
-    general_indexed_stocks = 0
+    def add_job(folder, stock):
+        with lock:
+            queued.add(stock[0])
+            pending[folder] += 1
+            general_stocks[1] += 1
 
-    for folder, folder_data, stocks in folders:
+    def get_jobs():
+        # first the jobs left by an indexing that was stopped or crashed,
+        # then the stocks found by the crawl, the stocks another indexing
+        # is converting are left to it
+        resumed, owned = get_unfinished_jobs()
+        resumed = [[folder, stock] for folder, stock in resumed if folder in folders]
 
-        indexed_stocks = folder_data['amount']
+        db.claim_jobs([stock[0] for _, stock in resumed], job_host, os.getpid())
 
-        for path, first_frame, last_frame, frames, is_sequence in stocks:
-            f = os.path.basename(path)
+        for folder, stock in resumed:
+            add_job(folder, stock)
+            yield folder, stock
 
-            if not is_sequence and not frames == 1:
-                frames = converter.get_frames(path)
-                first_frame = 1
-                last_frame = frames
+        last_checkpoint = time.time()
 
-            general_indexed_stocks += 1
-            percent = int(general_indexed_stocks * 100 / total_stocks)
+        for folder in list(folders):
+            for stock, changed in get_stocks_from_folder(folder, incomplete):
+                found.add(stock[0])
 
-            name, indexed_dir = converter.convert(
-                path, index_folder, first_frame, last_frame, is_sequence, frames == 1)
+                if stock[0] in queued or stock[0] in owned or not must_index(stock, changed):
+                    continue
 
-            create_thumbnail(indexed_dir)
+                db.add_job(folder, stock, job_host, os.getpid())
+                add_job(folder, stock)
 
-            indexed_stocks += 1
-            each_fn(f, folder, percent, indexed_stocks)
+                yield folder, stock
 
-            width, height = converter.get_format(path, first_frame)
+            with lock:
+                crawled.add(folder)
 
-            data['stocks'][path] = {
-                'path': path,
-                'element': '',
-                'type': '',
-                'folder': folder,
-                'name': name,
-                'resolution': [width, height],
-                'indexed': indexed_dir,
-                'passes': False,
-                'frames': frames,
-                'first_frame': first_frame,
-                'last_frame': last_frame,
-                'is_sequence': is_sequence
-            }
+                if not pending[folder]:
+                    finish_folder(folder)
 
-            if stop_threads():
-                break
+                if time.time() - last_checkpoint > checkpoint_interval:
+                    # the stocks of the crawled folders are all in the jobs,
+                    # so their manifest can be saved
+                    last_checkpoint = time.time()
+                    calculate_amount_by_folder()
+                    save_folders()
+                    save_manifest()
 
-        each_folder_fn(folder, indexed_stocks)
-        data['folders'][folder]['indexed'] = True
+    def run_job(folder, stock):
+        db.set_job_state(stock[0], 'running')
+        stock_nuke_jobs = []
 
-        if stop_threads():
-            break
+        try:
+            stock_data = index_stock(folder, stock, stock_nuke_jobs, stop_threads,
+                                     progress_fn)
+        except process.process_cancelled:
+            # killed by the stop, it is resumed the next time
+            db.set_job_state(stock[0], 'pending')
+            raise
+        except Exception as error:
+            db.set_job_state(stock[0], 'failed', str(error))
+            raise
+
+        if stock_nuke_jobs:
+            with lock:
+                nuke_jobs.extend(stock_nuke_jobs)
+                deferred.add(stock[0])
+
+        elif not preview_exists(stock_data['indexed']):
+            # the stock is not recorded, so the next refresh indexes it again
+            # even if its directory did not change
+            print('Error: no preview could be made for {}'.format(stock[0]))
+            db.set_job_state(stock[0], 'failed', 'No preview')
+            return None
+
+        return stock_data
+
+    def stock_indexed(job, stock_data):
+        # 'stock_data' is None for a stock without a preview
+        folder, stock = job
+        path = stock[0]
+
+        with lock:
+            if stock_data:
+                data['stocks'][path] = stock_data
+                db.upsert_stock(stock_data, commit=False)
+
+                # measured by 'measure_previews' once the nuke jobs are done
+                db.set_preview_size(stock_data['indexed'], None, commit=False)
+
+                # the stocks converted later with nuke stay 'running' until then
+                db.set_job_state(path, 'running' if path in deferred else 'done')
+                search.add(stock_data)
+
+                indexed_by_folder[folder] += 1
+
+            general_stocks[0] += 1
+            percent = int(general_stocks[0] * 100 / general_stocks[1])
+
+            pending[folder] -= 1
+
+            each_fn(os.path.basename(path), folder,
+                    percent, indexed_by_folder[folder])
+
+            if not pending[folder] and folder in crawled:
+                finish_folder(folder)
+
+    heartbeat_stop = threading.Event()
+
+    def heartbeat():
+        while not heartbeat_stop.wait(job_heartbeat_interval):
+            db.touch_jobs(job_host, os.getpid())
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+
+    try:
+        thread_pool(run_job, get_jobs(), get_setting('jobs'),
+                    stop_threads, stock_indexed)
+
+        convert_with_nuke(nuke_jobs, stop_threads)
+    except Exception:
+        # an error of the crawl, nothing is refreshed from an incomplete
+        # crawl, the indexed stocks are in the catalog and the unfinished
+        # jobs are resumed the next time
+        indexing = False
+        raise
+    finally:
+        heartbeat_stop.set()
+
+    db.delete_jobs(['done'])
+
+    # folders interrupted by a stop or with failed stocks are reported as well
+    for folder in folders:
+        if folder in finished:
+            continue
+
+        if stop_threads() and indexed_by_folder[folder] == started_amount[folder]:
+            continue
+
+        finish_folder(folder)
+
+    refresh_indexs(found, crawled - incomplete)
+
+    # the new stocks are tagged when indexed, all of them are only tagged
+    # again when the tags changed
+    tags_signature = get_tags_signature()
+    if not db.get_meta('tags_signature') == tags_signature:
+        db.upsert_stocks(update_stocks_tag())
+        db.set_meta('tags_signature', tags_signature)
 
-    update_stocks_tag()
     calculate_amount_by_folder()
 
     if not stop_threads():
         garbage_remove()
+        evict_previews()
 
-    save_data()
+    save_folders()
+    save_manifest()
 
     finished_fn()
     indexing = False
 
 
+def convert_with_nuke(nuke_jobs, stop_threads):
+    # the stocks that ffmpeg could not convert, in batches of the nuke
+    # workers so a nuke session converts many stocks
+    timeout = get_setting('process_timeout')
+
+    batches = [(nuke_jobs[i: i + nuke_batch_size], timeout)
+               for i in range(0, len(nuke_jobs), nuke_batch_size)]
+
+    def batch_converted(batch, results):
+        for job, result in zip(batch[0], results):
+            path = job['src']
+
+            if result['ok'] and path in data['stocks']:
+                create_thumbnail(data['stocks'][path]['indexed'])
+                db.set_job_state(path, 'done')
+            else:
+                print('Error: nuke could not convert {}: {}'.format(path, result['error']))
+                db.set_job_state(path, 'failed', result['error'])
+
+                # indexed again by the next refresh, like the stocks that
+                # ffmpeg could not convert
+                delete_stocks([path])
+
+    thread_pool(converter.convert_batch_with_nuke, batches, nuke_workers,
+                stop_threads, batch_converted)
+
+
+def index_stock(folder, stock, nuke_jobs=None, stop_threads=None, progress_fn=None):
+    path, first_frame, last_frame, frames, is_sequence = stock
+    timeout = get_setting('process_timeout')
+
+    metadata = converter.probe(path, first_frame or 1, stop_threads, timeout)
+
+    if not is_sequence and not frames == 1:
+        frames = metadata['frames']
+        first_frame = 1
+        last_frame = frames
+
+    convert_progress = None
+    if progress_fn and not frames == 1:
+        convert_progress = stock_progress(
+            path, first_frame, last_frame, frames, is_sequence, progress_fn)
+
+    try:
+        name, indexed_dir = converter.convert(path, index_folder, first_frame, last_frame,
+                                              is_sequence, frames == 1, thumbnails_folder,
+                                              get_setting('packed_previews'),
+                                              get_fingerprint(path, first_frame, last_frame, is_sequence),
+                                              nuke_jobs, stop_threads, timeout, convert_progress)
+    finally:
+        if convert_progress:
+            # also when ffmpeg failed or was stopped before its last block
+            convert_progress.finish()
+
+    # only when ffmpeg could not create the thumbnail during the conversion
+    create_thumbnail(indexed_dir)
+
+    return {
+        'path': path,
+        'element': detect_element(path),
+        'type': detect_type(path),
+        'folder': folder,
+        'name': name,
+        'resolution': [metadata['width'], metadata['height']],
+        'indexed': indexed_dir,
+        'passes': False,
+        'frames': frames,
+        'first_frame': first_frame,
+        'last_frame': last_frame,
+        'is_sequence': is_sequence,
+        'fps': metadata['fps'],
+        'codec': metadata['codec'],
+        'pix_fmt': metadata['pix_fmt'],
+        'duration': metadata['duration'],
+        'channel_layout': metadata['channel_layout']
+    }
+
+
+class stock_progress():
+    # turns the progress blocks of ffmpeg of one stock into the frame, the
+    # speed and the time left of its conversion, at most one each
+    # 'progress_interval' and always the last one
+    def __init__(self, path, first_frame, last_frame, frames, is_sequence, fn):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.fn = fn
+        self.start = time.time()
+        self.last_update = 0
+        self.frame = 0
+        self.finished = False
+
+        # the same frames that 'converter.convert' writes to the preview
+        self.frames = max(1, converter.get_preview_frames(first_frame, last_frame))
+
+        # bytes read for the preview, estimated from the first frame of the
+        # sequences and from the part of the movies that is converted
+        try:
+            if is_sequence:
+                first_path = sequence.get_frame_path(path, first_frame)
+                self.source_size = os.path.getsize(first_path) * self.frames
+            else:
+                self.source_size = os.path.getsize(
+                    path) * self.frames / max(frames, self.frames)
+        except OSError:
+            self.source_size = 0
+
+    def __call__(self, block):
+        finished = block.get('progress') == 'end'
+        now = time.time()
+
+        if not finished and now - self.last_update < progress_interval:
+            return
+
+        try:
+            frame = min(int(block.get('frame', 0)), self.frames)
+        except ValueError:
+            if not finished:
+                return
+            frame = self.frame
+
+        self.last_update = now
+        self.frame = frame
+        self.finished = finished
+
+        elapsed = max(now - self.start, 0.001)
+        fps = frame / elapsed
+        read_mb = self.source_size * frame / self.frames / 1048576.0
+
+        self.fn({
+            'path': self.path,
+            'name': self.name,
+            'finished': finished,
+            'frame': frame,
+            'frames': self.frames,
+            'percent': int(frame * 100 / self.frames),
+            'fps': fps,
+            'mb_per_second': read_mb / elapsed,
+            'eta': (self.frames - frame) / fps if fps else -1
+        })
+
+    def finish(self):
+        if not self.finished:
+            self({'progress': 'end', 'frame': str(self.frame)})
+
+
+def get_fingerprint(path, first_frame, last_frame, is_sequence):
+    # name of the preview from the content of the stock: the frame range, and
+    # the size and some samples of the first, middle and last frame, or of
+    # the movie, so copies of a stock in several folders share the preview
+    if is_sequence:
+        middle_frame = int((first_frame + last_frame) / 2)
+        files = [sequence.get_frame_path(path, f)
+                 for f in [first_frame, middle_frame, last_frame]]
+    else:
+        files = [path]
+
+    fingerprint = hashlib.md5('{}-{}'.format(first_frame, last_frame).encode())
+
+    for filename in files:
+        try:
+            size = os.path.getsize(filename)
+
+            with open(filename, 'rb') as f:
+                for offset in [0, int(size / 2), size - fingerprint_sample_size]:
+                    f.seek(max(0, offset))
+                    fingerprint.update(f.read(fingerprint_sample_size))
+
+        except (OSError, IOError):
+            # a missing frame of a sequence
+            size = -1
+
+        fingerprint.update(str(size).encode())
+
+    return fingerprint.hexdigest()
+
+
 def update_stocks_tag():
+    # returns the stocks whose tags changed
+    changed = []
+
     for path, stock in get_indexed_stocks().items():
-        stock['element'] = detect_element(path)
-        stock['type'] = detect_type(path)
+        element = detect_element(path)
+        _type = detect_type(path)
+
+        if element == stock['element'] and _type == stock['type']:
+            continue
+
+        stock['element'] = element
+        stock['type'] = _type
+        changed.append(stock)
+        search.add(stock)
+
+    return changed
+
+
+def get_preview_name(indexed):
+    name = os.path.basename(indexed)
+
+    if preview_pack.is_packed(name):
+        return name.rsplit('.', 1)[0]
+
+    return name
+
+
+def get_thumbnail_tier(size):
+    for tier in thumbnail_tiers:
+        if tier >= size:
+            return tier
+
+    return thumbnail_tiers[-1]
+
+
+def get_thumbnail(indexed, size=0):
+    # with 'size' the thumbnail of the tier for icons of that size, which
+    # may not exist yet
+    name = get_preview_name(indexed)
+
+    if not size:
+        return '{}/{}.jpg'.format(thumbnails_folder, name)
+
+    return '{}/{}/{}.jpg'.format(thumbnails_folder, get_thumbnail_tier(size), name)
+
+
+def get_middle_frame(indexed):
+    # the jpg data of the middle frame of a preview, None without frames
+    if not preview_exists(indexed):
+        return None
+
+    if preview_pack.is_packed(indexed):
+        reader = preview_pack.pack_reader(indexed)
+        frame_data = reader.get_middle()
+        reader.close()
+
+        return frame_data
+
+    frames = list(preview_pack.get_frame_files(indexed).values())
+    if not frames:
+        return None
+
+    with open(frames[int(len(frames) / 2)], 'rb') as f:
+        return f.read()
+
+
+def preview_exists(indexed):
+    if preview_pack.is_packed(indexed):
+        return os.path.isfile(indexed)
+
+    return os.path.isdir(indexed) and bool(os.listdir(indexed))
 
 
 def create_thumbnail(indexed_stock):
-    thumbnail = '{}/{}.jpg'.format(thumbnails_folder,
-                                   os.path.basename(indexed_stock))
+    thumbnail = get_thumbnail(indexed_stock)
 
     if os.path.isfile(thumbnail):
         return
 
-    ref_size = 0
-    src = ''
-    for f in os.listdir(indexed_stock):
-        pic = os.path.join(indexed_stock, f)
+    frame_data = get_middle_frame(indexed_stock)
+    if not frame_data:
+        return
 
-        size = os.path.getsize(pic)
-        if size >= ref_size:
-            ref_size = size
-            src = pic
+    tmp_frame = thumbnail + '.src.jpg'
+    with open(tmp_frame, 'wb') as f:
+        f.write(frame_data)
 
     ffmpeg, _ = converter.get_ffmpeg()
 
-    cmd = '{} -i "{}" -vf scale=120:-1 -q:v 1 "{}"'.format(
-        ffmpeg, src, thumbnail)
+    cmd = [ffmpeg, '-i', tmp_frame, '-vf', 'scale={}:-1'.format(thumbnail_width),
+           '-q:v', '1', thumbnail]
+
+    try:
+        process.run(cmd, get_setting('process_timeout'))
+    except process.process_error as error:
+        print(error)
+
+    os.remove(tmp_frame)
+
+
+def pack_previews(stop_threads=lambda: False):
+    # migrates the preview directories of the indexed stocks to packs
+    stocks_loaded.wait()
+
+    previews = OrderedDict()
+    for _, stock in get_indexed_stocks().items():
+        previews.setdefault(stock['indexed'], []).append(stock)
+
+    packed = 0
+
+    for indexed, stocks in previews.items():
+        if stop_threads():
+            break
+
+        if preview_pack.is_packed(indexed) or not preview_exists(indexed):
+            continue
+
+        pack_file = preview_pack.pack(indexed)
 
-    os.system(cmd)
+        for stock in stocks:
+            stock['indexed'] = pack_file
+
+        db.upsert_stocks(stocks)
+
+        # the thumbnails of the directory are the ones of the pack, so the
+        # directory is deleted from the catalog instead of being collected
+        db.delete_previews([indexed])
+        packed += 1
+
+    return packed
 
 
 def calculate_amount_by_folder():
@@ -266,135 +893,212 @@ def save_indexed_folder(folder):
         'amount': 0
     }
 
-    save_data()
+    db.upsert_folder(data['folders'][folder])
 
 
-def get_stocks_from_folder(folder):
+def get_stocks_from_folder(folder, incomplete=None):
+    # yields [stock, changed] for every stock in the folder tree as the
+    # directories are scanned, using the manifest to skip directories that
+    # did not change since the last scan. The manifest of the folder is only
+    # replaced once the whole tree was crawled. The folder is added to
+    # 'incomplete' when a directory that is not in the manifest can not be
+    # read, since its stocks are not known.
 
     force_textures = 'texture' in os.path.basename(folder).lower()
 
-    stocks = []
-    scanned_dirs = []
+    if not os.path.isdir(folder):
+        return
 
-    for root, _, files in os.walk(folder):
-        for name in files:
-            file = os.path.join(root, name).replace('\\', '/')
-            ext = get_extension(file).lower()
+    old_manifest = manifest.get(folder, {})
+    new_manifest = {}
 
-            if ext == 'mov' or ext == 'mp4':
-                stock = [file, None, None, None,  False]
-                if not stock in stocks:
-                    stocks.append(stock)
+    seen = set()
+    to_scan = [folder]
 
-            elif ext in ['jpg', 'jpeg', 'tiff', 'tif', 'png', 'exr']:
-                sequence_dir = os.path.dirname(file)
-                if sequence_dir in scanned_dirs:
-                    continue
+    while to_scan:
+        directory = to_scan.pop()
+
+        try:
+            entry, changed = scan_directory(
+                directory, old_manifest.get(directory), force_textures)
+        except OSError as error:
+            print('Error: {} can not be read: {}'.format(directory, error))
 
-                scanned_dirs.append(sequence_dir)
+            if not incomplete is None:
+                incomplete.add(folder)
+            continue
 
-                if force_textures:
-                    for l in os.listdir(sequence_dir):
-                        texture = os.path.join(sequence_dir, l)
-                        stock = [texture, 1, 1, 1, False]
-                        if not stock in stocks:
-                            stocks.append(stock)
+        if not entry:
+            continue
 
-                    continue
+        new_manifest[directory] = entry
 
-                textures, sequences = separate_texture_and_sequence(
-                    sequence_dir)
+        for stock in entry['stocks']:
+            if stock[0] in seen:
+                continue
 
-                for texture in textures:
-                    stock = [texture, 1, 1, 1, False]
-                    if not stock in stocks:
-                        stocks.append(stock)
+            seen.add(stock[0])
+            yield stock, changed
 
-                for stock in sequences:
-                    if not stock in stocks:
-                        stocks.append(stock)
+        for name in entry['dirs']:
+            to_scan.append('{}/{}'.format(directory, name))
 
-    return stocks
+    manifest[folder] = new_manifest
+
+
+def scan_directory(directory, cached, force_textures):
+    # returns None for a directory that does not exist anymore, and raises
+    # OSError when it can not be read and it is not in the manifest
+    try:
+        mtime = os.stat(directory).st_mtime
 
+        if cached and cached['mtime'] == mtime:
+            if cached['scanned'] - mtime > mtime_resolution:
+                return cached, False
 
-def separate_texture_and_sequence(folder):
-    textures = []
-    sequences = []
+        scanned = time.time()
+        entries = list(os.scandir(directory))
 
-    sequences_to_textures = []
+    except OSError as error:
+        if error.errno in [errno.ENOENT, errno.ENOTDIR]:
+            return None, False
 
-    min_frames = 24
+        # a directory that exists but can not be read now, like a stale
+        # handle on NFS, keeps the stocks of the last scan
+        if cached:
+            return cached, False
 
-    for sequence in nuke.getFileNameList(folder, True):
+        raise
+
+    dirs = []
+    media = []
+    size = 0
+
+    for entry in entries:
         try:
-            seq_name, frange = sequence.rsplit(' ', 1)
-        except:
-            textures.append(os.path.join(folder, sequence).replace('\\', '/'))
+            if entry.is_dir():
+                # like 'os.walk', links to directories are not followed
+                if not entry.is_symlink():
+                    dirs.append(entry.name)
+                continue
+
+            ext = os.path.splitext(entry.name)[1][1:].lower()
+            if not ext in video_extensions and not ext in image_extensions:
+                continue
+
+            file_size = entry.stat().st_size
+        except OSError:
             continue
 
-        if not get_extension(seq_name):
-            continue
+        media.append((entry.name, ext, file_size))
+        size += file_size
+
+    entry = {
+        'mtime': mtime,
+        'scanned': scanned,
+        'files': len(media),
+        'size': size,
+        'dirs': sorted(dirs),
+        'force_textures': force_textures,
+        'stocks': []
+    }
+
+    if cached and cached['force_textures'] == force_textures:
+        if cached['files'] == entry['files'] and cached['size'] == entry['size']:
+            # only the directory metadata changed, not its media
+            entry['stocks'] = cached['stocks']
+            return entry, False
+
+    entry['stocks'] = get_stocks_from_directory(
+        directory, media, force_textures)
+
+    return entry, True
 
-        first, last = frange.split('-')
-        first_frame = int(first)
-        last_frame = int(last)
-        frames = last_frame - first_frame + 1
 
-        if frames < min_frames:
-            sequences_to_textures.append((seq_name, first_frame, last_frame))
+def get_stocks_from_directory(directory, media, force_textures):
+    stocks = []
+    sizes = {}
+
+    for name, ext, file_size in media:
+        if ext in video_extensions:
+            if file_size < 10000:
+                continue
+
+            stocks.append(['{}/{}'.format(directory, name), None, None, None, False])
+        else:
+            sizes[name] = file_size
+
+    if not sizes:
+        return stocks
+
+    if force_textures:
+        textures = sorted(sizes)
+        sequences = []
+    else:
+        textures, sequences = separate_texture_and_sequence(sorted(sizes))
+
+    for name in textures:
+        if sizes[name] < 10000:
             continue
 
-        sequence = [os.path.join(folder, seq_name).replace('\\', '/'),
-                    first_frame, last_frame, frames, True]
+        stocks.append(['{}/{}'.format(directory, name), 1, 1, 1, False])
 
-        sequences.append(sequence)
+    for name, first_frame, last_frame in sequences:
+        stocks.append(['{}/{}'.format(directory, name), first_frame,
+                       last_frame, last_frame - first_frame + 1, True])
 
-    for filename, first, last in sequences_to_textures:
-        sequence = os.path.join(folder, filename)
-        for texture in get_sequence(sequence, [first, last]):
-            textures.append(texture)
+    return stocks
 
-    return textures, sequences
 
+def separate_texture_and_sequence(filenames):
+    # returns the texture filenames and the sequences of one directory
+    # listing as ('name_####.ext', first_frame, last_frame)
+    textures, sequences = [], []
 
-def match_to_tags(name, tags):
-    matches = []
+    singles, found = sequence.group(filenames)
+    textures += singles
 
-    for tag in tags:
-        if tag in name.lower():
-            matches.append(tag)
+    for seq in found:
+        if len(seq) < min_sequence_frames:
+            textures += [seq.get_filename(f) for f in seq.frames]
+            continue
 
-    if not matches:
-        return 'not labeled'
+        sequences.append((seq.get_pattern(), seq.first(), seq.last()))
 
-    return max(matches, key=len)
+    return textures, sequences
 
 
 def detect_type(stock_file):
     stock_name = os.path.basename(stock_file)
-    return match_to_tags(stock_name, stock_types)
+    return type_tagger.match(stock_name)
 
 
 def detect_element(stock_file):
-    _type = match_to_tags(os.path.basename(stock_file), stock_elements)
+    _type = element_tagger.match(os.path.basename(stock_file))
     if not _type == 'not labeled':
         return _type
 
-    return match_to_tags(os.path.basename(os.path.dirname(stock_file)), stock_elements)
+    return element_tagger.match(os.path.basename(os.path.dirname(stock_file)))
 
 
 def remove_stock(indexed_dir):
-    if not os.path.isdir(indexed_dir):
-        return
-
-    shutil.rmtree(indexed_dir)
-    thumbnail = '{}/{}.jpg'.format(thumbnails_folder,
-                                   os.path.basename(indexed_dir))
-    if os.path.isfile(thumbnail):
-        os.remove(thumbnail)
-
-
-def refresh_indexs():
+    # the thumbnails are removed even without the preview, which may have
+    # been evicted
+    if os.path.isdir(indexed_dir):
+        shutil.rmtree(indexed_dir)
+    elif os.path.isfile(indexed_dir):
+        os.remove(indexed_dir)
+
+    for size in [0] + thumbnail_tiers:
+        thumbnail = get_thumbnail(indexed_dir, size)
+        if os.path.isfile(thumbnail):
+            os.remove(thumbnail)
+
+
+def refresh_indexs(found, crawled):
+    # 'found' are the stocks paths that 'get_stocks_from_folder' returned,
+    # stocks of connected folders that are not found anymore are deleted,
+    # only for the folders in 'crawled', whose crawl was not interrupted
     folders = data['folders']
 
     to_delete = []
@@ -404,41 +1108,171 @@ def refresh_indexs():
         if folder in folders and not os.path.isdir(folder):
             continue
 
-        path = stock['path']
-
-        if stock['is_sequence']:
-            if not os.path.isdir(os.path.dirname(path)):
-                to_delete.append(stock)
+        if not folder in folders:
+            to_delete.append(stock)
 
-        elif not os.path.isfile(path):
+        elif folder in crawled and not stock['path'] in found:
             to_delete.append(stock)
 
-        if not folder in folders:
-            if not stock in to_delete:
-                to_delete.append(stock)
+    delete_stocks([stock['path'] for stock in to_delete])
+    remove_unreferenced_previews()
+
+
+def delete_stocks(paths):
+    # their previews are removed by 'remove_unreferenced_previews'
+    db.delete_stocks(paths)
 
-    for stock in to_delete:
-        key = stock['path']
-        del data['stocks'][key]
+    for path in paths:
+        if path in data['stocks']:
+            del data['stocks'][path]
+            search.remove(path)
 
-        indexed_dir = stock['indexed']
-        remove_stock(indexed_dir)
+
+def remove_unreferenced_previews():
+    for indexed in db.pop_unreferenced_previews():
+        remove_stock(indexed)
 
 
 def garbage_remove():
+    # previews that no stock uses, and files of the index folder that are
+    # not in the catalog, except the ones of the indexings that are running
+    # in other processes: the temporary files of their conversions, and the
+    # previews they just finished, which may not be in the catalog yet
+    remove_unreferenced_previews()
+
+    previews = set(db.get_previews())
+    owners = get_job_owners()
+    recent = time.time() - job_heartbeat_timeout
+
+    for entry in os.scandir(index_folder):
+        indexed = os.path.join(index_folder, entry.name).replace('\\', '/')
+        if indexed in previews:
+            continue
 
-    indexed_folders = []
-    for _, stock in data['stocks'].items():
-        indexed_folders.append(stock['indexed'])
+        try:
+            # a rename changes the ctime
+            stat = entry.stat()
+            if max(stat.st_mtime, stat.st_ctime) > recent:
+                continue
+        except OSError:
+            continue
 
-    for name in os.listdir(index_folder):
-        folder = os.path.join(index_folder, name).replace('\\', '/')
-        if folder in indexed_folders:
+        if is_tmp_owned(entry.name, owners):
             continue
 
-        remove_stock(folder)
+        remove_stock(indexed)
+
+
+def get_preview_size(indexed):
+    if preview_pack.is_packed(indexed):
+        return os.path.getsize(indexed) if os.path.isfile(indexed) else 0
+
+    size = 0
+
+    try:
+        for entry in os.scandir(indexed):
+            size += entry.stat().st_size
+    except OSError:
+        pass
+
+    return size
+
+
+def measure_previews():
+    # the previews without a size: new, packed, or from catalogs from before
+    # the sizes, the others are never measured again
+    db.set_preview_sizes([[indexed, get_preview_size(indexed)]
+                          for indexed in db.get_unmeasured_previews()])
+
+
+def get_store_size():
+    # bytes of the previews on disk, from the sizes in the catalog
+    measure_previews()
+    return db.get_store_size()
+
+
+def remove_preview(indexed):
+    # removes the frames of a preview and keeps its thumbnails
+    try:
+        if os.path.isdir(indexed):
+            shutil.rmtree(indexed)
+        elif os.path.isfile(indexed):
+            os.remove(indexed)
+    except OSError:
+        # a pack open in the player on windows
+        return False
+
+    return True
+
+
+def evict_previews(keep=None):
+    # removes the least recently viewed previews until the store is within
+    # the 'preview_cache_mb' setting, except the ones in 'keep'
+    keep = keep or []
+
+    budget = get_setting('preview_cache_mb') * 1024 * 1024
+    if not budget > 0:
+        return 0
+
+    measure_previews()
+
+    store_size = db.get_store_size()
+    evicted = 0
+
+    for indexed, size in db.get_eviction_order():
+        if store_size <= budget:
+            break
+
+        if indexed in keep or not remove_preview(indexed):
+            continue
+
+        db.set_preview_evicted(indexed)
+        store_size -= size
+        evicted += 1
+
+    return evicted
+
+
+def preview_viewed(indexed):
+    db.set_preview_viewed(indexed)
+
+
+def is_evicted(indexed):
+    return db.is_evicted(indexed)
+
+
+def restore_preview(stock):
+    # makes again the preview of a stock removed by 'evict_previews', returns
+    # True if the preview is on disk
+    indexed = stock['indexed']
+
+    with restore_lock:
+        if preview_exists(indexed):
+            return True
+
+        try:
+            converter.convert(stock['path'], index_folder, stock['first_frame'], stock['last_frame'],
+                              stock['is_sequence'], stock['frames'] == 1, None,
+                              preview_pack.is_packed(indexed), get_preview_name(indexed),
+                              timeout=get_setting('process_timeout'))
+        except Exception as error:
+            print('The preview could not be made again: {}'.format(error))
+            return False
+
+        if not preview_exists(indexed):
+            return False
+
+        db.set_preview_size(indexed, get_preview_size(indexed))
+
+    evict_previews([indexed])
+
+    return True
 
 
 def delete_folder(folder):
     del data['folders'][folder]
-    save_data()
+    db.delete_folder(folder)
+
+    if folder in manifest:
+        del manifest[folder]
+        save_manifest()
@@ -4,10 +4,13 @@
 import os
 import nuke
 import threading
+import traceback
+from collections import OrderedDict
 
 from . import indexing
 from .converter import get_ffmpeg
 
+from PySide2.QtCore import QTimer
 from PySide2.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                                QPushButton, QTreeWidget, QTreeWidgetItem,
                                QFileDialog, QAbstractItemView, QTreeView)
@@ -60,6 +63,16 @@ class dirs_stock(QWidget):
 
         self.stocks = stocks
         self.status_bar = status_bar
+
+        # the indexing threads leave here the last progress of each stock,
+        # it is shown from the main thread once each 'progress_interval',
+        # whatever the amount of stocks being converted
+        self.progress_lock = threading.Lock()
+        self.progress_updates = OrderedDict()
+        self.progress_timer = QTimer()
+        self.progress_timer.setInterval(int(indexing.progress_interval * 1000))
+        self.progress_timer.timeout.connect(self.show_progress)
+
         layout = QVBoxLayout()
         self.setLayout(layout)
 
@@ -79,7 +92,19 @@ class dirs_stock(QWidget):
         self.refresh_index_btn = QPushButton('Refresh Indexs')
         self.refresh_index_btn.clicked.connect(self.refresh_indexs)
 
+        self.pack_btn = QPushButton('Pack Previews')
+        self.pack_btn.setToolTip(
+            'Packs the preview frames of every indexed stock into a single file')
+        self.pack_btn.clicked.connect(self.pack_previews)
+
+        self.store_label = QLabel()
+        self.store_label.setToolTip(
+            'Disk used by the previews, the "preview_cache_mb" setting limits it')
+
         buttons_layout.addWidget(self.refresh_index_btn)
+        buttons_layout.addWidget(self.pack_btn)
+        buttons_layout.addStretch()
+        buttons_layout.addWidget(self.store_label)
         buttons_layout.addStretch()
         buttons_layout.addWidget(self.delete_btn)
         buttons_layout.addWidget(self.add_button)
@@ -91,6 +116,11 @@ class dirs_stock(QWidget):
             self.add_path(folder, data['indexed'], data['amount'])
 
         self.update_total_stocks()
+        self.update_store_size()
+
+        # an indexing that was stopped or crashed goes on where it was left
+        if indexing.has_unfinished_jobs():
+            QTimer.singleShot(0, self.resume_indexing)
 
 
     def add_path_dialog(self):
@@ -129,18 +159,58 @@ class dirs_stock(QWidget):
 
         self.refresh_index_btn.clicked.connect(_stop_threads)
 
+        self.progress_timer.start()
+
         self.stop_threads = False
         threading.Thread(
             target=self.refresh_indexs_thread,
             args=(0, lambda: self.stop_threads)
         ).start()
 
+    def resume_indexing(self):
+        ffmpeg, ffprobe = get_ffmpeg()
+        if not ffmpeg or not ffprobe or indexing.is_indexing():
+            return
+
+        self.refresh_indexs()
+
+    def pack_previews(self):
+        if indexing.is_indexing():
+            return
+
+        if not nuke.ask('Pack the previews of all indexed stocks ?'):
+            return
+
+        self.pack_btn.setEnabled(False)
+        self.refresh_index_btn.setEnabled(False)
+
+        def pack_thread():
+            packed = indexing.pack_previews()
+            nuke.executeInMainThread(self.finished_pack, (packed))
+
+        threading.Thread(target=pack_thread).start()
+
+    def finished_pack(self, packed):
+        self.pack_btn.setEnabled(True)
+        self.refresh_index_btn.setEnabled(True)
+
+        nuke.message('{} previews packed !'.format(packed))
+
     def refresh_indexs_thread(self, _, stop_threads):
         self.add_button.setEnabled(False)
         self.delete_btn.setEnabled(False)
+        self.pack_btn.setEnabled(False)
 
-        indexing.to_index(self.finished_index,
-                          self.each_folder_index, self.each_index, stop_threads)
+        try:
+            indexing.to_index(self.finished_index,
+                              self.each_folder_index, self.each_index, stop_threads,
+                              progress_fn=self.each_progress)
+        except Exception as error:
+            traceback.print_exc()
+            nuke.executeInMainThread(
+                nuke.message, ('The indexing failed: {}'.format(error),))
+
+            self.finished_index()
 
     def each_index(self, f, folder, percent, indexed_stocks):
         item = self.get_item(folder)
@@ -153,6 +223,21 @@ class dirs_stock(QWidget):
         self.update_item(item, -1, indexed_stocks)
         self.update_total_stocks()
 
+    def each_progress(self, progress):
+        with self.progress_lock:
+            self.progress_updates[progress['path']] = progress
+
+    def show_progress(self):
+        with self.progress_lock:
+            updates = list(self.progress_updates.values())
+            self.progress_updates.clear()
+
+        for progress in updates:
+            self.status_bar.set_indexing_progress(progress)
+
+        if not updates and not indexing.is_indexing():
+            self.progress_timer.stop()
+
     def each_folder_index(self, folder, amount):
         item = self.get_item(folder)
         if not item:
@@ -163,6 +248,7 @@ class dirs_stock(QWidget):
     def finished_index(self):
         self.add_button.setEnabled(True)
         self.delete_btn.setEnabled(True)
+        self.pack_btn.setEnabled(True)
         self.refresh_index_btn.setText('Refresh Indexs')
         self.refresh_index_btn.clicked.disconnect()
         self.refresh_index_btn.clicked.connect(self.refresh_indexs)
@@ -172,6 +258,7 @@ class dirs_stock(QWidget):
             self.status_bar.set_indexing_stock, ('finished'))
 
         self.update_total_stocks()
+        self.update_store_size()
         nuke.executeInMainThread(self.stocks.clear_and_refresh)
 
     def update_item(self, item, status, amount):
@@ -204,6 +291,20 @@ class dirs_stock(QWidget):
         nuke.executeInMainThread(
             self.status_bar.set_total_stocks, (total_stocks))
 
+    def update_store_size(self):
+        # the previews of old catalogs are measured the first time
+        def store_size_thread():
+            size = indexing.get_store_size() / (1024.0 ** 3)
+            budget = indexing.get_setting('preview_cache_mb') / 1024.0
+
+            text = 'Previews: {:.1f} GB'.format(size)
+            if budget > 0:
+                text = 'Previews: {:.1f} / {:.1f} GB'.format(size, budget)
+
+            nuke.executeInMainThread(self.store_label.setText, (text,))
+
+        threading.Thread(target=store_size_thread).start()
+
     def add_path(self, path, indexed=False, amount=0):
         item = QTreeWidgetItem()
 
@@ -1,13 +1,90 @@
 # Author: Francisco Jose Contreras Cuevas
 # Office: VFX Artist - Senior Compositor
 # Website: vinavfx.com
+import os
+from collections import OrderedDict
 
-from PySide2.QtCore import (Qt, QTimeLine)
-from PySide2.QtGui import (QPixmap, QIcon)
+from PySide2.QtCore import (Qt, QTimeLine, QObject, QRunnable, QThreadPool, Signal)
+from PySide2.QtGui import (QPixmap, QIcon, QImage)
 from PySide2.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QSlider)
 
 from ..nuke_util.nuke_util import get_nuke_path
+from . import preview_pack
+from . import indexing
+
+
+def scale_image(image, resolution, width, height):
+    # works for QImage and QPixmap, so it can be used out of the main thread
+    w, h = resolution
+
+    if w > h and width / height < w / h:
+        return image.scaledToWidth(width, Qt.SmoothTransformation)
+    elif width / height < w / h:
+        return image.scaledToWidth(width, Qt.SmoothTransformation)
+
+    return image.scaledToHeight(height, Qt.SmoothTransformation)
+
+
+class frame_cache():
+    # LRU of decoded and scaled frames, limited by the memory they use
+    def __init__(self, budget):
+        self.budget = budget
+        self.size = 0
+        self.frames = OrderedDict()
+
+    def get(self, key):
+        image = self.frames.get(key)
+        if image is None:
+            return None
+
+        self.frames.move_to_end(key)
+        return image
+
+    def put(self, key, image):
+        if key in self.frames:
+            return
+
+        self.frames[key] = image
+        self.size += image.width() * image.height() * 4
+
+        while self.size > self.budget and len(self.frames) > 1:
+            _, old = self.frames.popitem(last=False)
+            self.size -= old.width() * old.height() * 4
+
+    def clear(self):
+        self.frames.clear()
+        self.size = 0
+
+
+class frame_loader_signals(QObject):
+    loaded = Signal(object, object)
+
+
+class frame_loader(QRunnable):
+    # decodes and scales a frame in a QThreadPool thread, 'source' is the
+    # path of the jpg or the data of the frame in a pack
+    def __init__(self, key, source, resolution, signals):
+        QRunnable.__init__(self)
+
+        self.key = key
+        self.source = source
+        self.resolution = resolution
+        self.signals = signals
+
+    def run(self):
+        image = QImage()
+
+        if isinstance(self.source, bytes):
+            image.loadFromData(self.source)
+        else:
+            image.load(self.source)
+
+        if not image.isNull():
+            _, _, width, height = self.key
+            image = scale_image(image, self.resolution, width, height)
+
+        self.signals.loaded.emit(self.key, image)
 
 class slider(QSlider):
     def __init__(self):
@@ -34,7 +111,7 @@ class player(QWidget):
         self.setLayout(layout)
 
         self.timeline = QTimeLine()
-        self.timeline.setUpdateInterval(1)
+        self.timeline.setUpdateInterval(int(1000 / 60))
         self.timeline.setCurveShape(QTimeLine.LinearCurve)
         self.timeline.frameChanged.connect(self.set_frame)
         self.timeline.finished.connect(self.stop)
@@ -68,17 +145,49 @@ class player(QWidget):
 
         self.playing = False
         self.image_path = ''
+        self.pack = None
+        self.frame_files = {}
         self.frames = 300
         self.frame = 0
 
+        self.cache = frame_cache(
+            indexing.get_setting('player_cache_mb') * 1024 * 1024)
+        self.prefetch = indexing.get_setting('player_prefetch')
+        self.prefetching = set()
+
+        self.loader_pool = QThreadPool()
+        self.loader_pool.setMaxThreadCount(2)
+        self.loader_signals = frame_loader_signals()
+        self.loader_signals.loaded.connect(self.frame_loaded)
+
         self.time_slider.setEnabled(False)
         self.play_pause_btn.setEnabled(False)
 
+    def resizeEvent(self, event):
+        # the cached frames are scaled to the previous size
+        self.cache.clear()
+        QWidget.resizeEvent(self, event)
+
     def set_path(self, name, path, src_frames, resolution):
+        self.close_pack()
+        self.loader_pool.clear()
+        self.prefetching.clear()
+
+        if preview_pack.is_packed(path) and os.path.isfile(path):
+            self.pack = preview_pack.pack_reader(path)
+            self.frame_files = {}
+        else:
+            # the frames of a preview shared by several stocks do not have
+            # the name of this stock
+            self.frame_files = preview_pack.get_frame_files(path)
+
         self.image_path = path
         self.name = name
         self.resolution = resolution
 
+        # the least recently viewed previews are evicted first
+        indexing.preview_viewed(path)
+
         w, h = self.resolution
         if not w or not h:
             return
@@ -91,7 +200,7 @@ class player(QWidget):
         if is_texture:
             self.stop()
             self.time_slider.set_value(0)
-            self.set_pixmap('{}/{}.jpg'.format(path, name))
+            self.label_view.setPixmap(self.load_pixmap())
             self.frame_counter.setText('')
             return
 
@@ -110,34 +219,83 @@ class player(QWidget):
         frame = int(percent * self.frames / 100)
         self.set_frame(frame, False)
 
-    def set_frame(self, frame, set_in_slider=True):
-        image_path = '{}/{}_{}.jpg'.format(self.image_path, self.name, frame)
-        self.set_pixmap(image_path)
+    def close_pack(self):
+        if self.pack:
+            self.pack.close()
+            self.pack = None
 
-        self.frame_counter.setText(str(frame))
+    def get_source(self, frame=None):
+        # without 'frame' it is the only frame of a texture
+        if self.pack:
+            frames = self.pack.get_frames()
+            if frame is None and frames:
+                frame = frames[0]
 
-        if set_in_slider:
-            value = (frame * 100) / self.frames
-            self.time_slider.set_value(value)
+            return self.pack.get(frame) or b''
 
-        self.frame = frame
+        if frame is None:
+            return next(iter(self.frame_files.values()), '')
 
-    def set_pixmap(self, image_path):
+        return self.frame_files.get(frame, '')
 
-        image = QPixmap(image_path)
+    def get_key(self, frame):
+        return (self.image_path, frame, self.label_view.width(), self.label_view.height())
 
-        w, h = self.resolution
-        width = self.label_view.width()
-        height = self.label_view.height()
+    def load_pixmap(self, frame=None):
+        key = self.get_key(frame)
 
-        if w > h and width / height < w / h:
-            image = image.scaledToWidth(width, Qt.SmoothTransformation)
-        elif width / height < w / h:
-            image = image.scaledToWidth(width, Qt.SmoothTransformation)
+        image = self.cache.get(key)
+        if not image is None:
+            return image
+
+        source = self.get_source(frame)
+
+        image = QPixmap()
+        if isinstance(source, bytes):
+            image.loadFromData(source)
         else:
-            image = image.scaledToHeight(height, Qt.SmoothTransformation)
+            image.load(source)
+
+        if not image.isNull():
+            image = scale_image(image, self.resolution,
+                                self.label_view.width(), self.label_view.height())
+
+        self.cache.put(key, image)
+
+        return image
+
+    def prefetch_frames(self, frame):
+        last_frame = min(frame + self.prefetch, self.frames)
+
+        for next_frame in range(frame + 1, last_frame + 1):
+            key = self.get_key(next_frame)
 
-        self.label_view.setPixmap(image)
+            if key in self.prefetching or not self.cache.get(key) is None:
+                continue
+
+            self.prefetching.add(key)
+            self.loader_pool.start(frame_loader(
+                key, self.get_source(next_frame), self.resolution, self.loader_signals))
+
+    def frame_loaded(self, key, image):
+        self.prefetching.discard(key)
+
+        if not key[0] == self.image_path:
+            return
+
+        self.cache.put(key, QPixmap.fromImage(image))
+
+    def set_frame(self, frame, set_in_slider=True):
+        self.label_view.setPixmap(self.load_pixmap(frame))
+        self.prefetch_frames(frame)
+
+        self.frame_counter.setText(str(frame))
+
+        if set_in_slider:
+            value = (frame * 100) / self.frames
+            self.time_slider.set_value(value)
+
+        self.frame = frame
 
     def play_pause_toggle(self):
         self.playing = not self.playing
@@ -0,0 +1,150 @@
+# Author: Francisco Jose Contreras Cuevas
+# Office: VFX Artist - Senior Compositor
+# Website: vinavfx.com
+import os
+import mmap
+import shutil
+import struct
+from collections import OrderedDict
+
+from ..python_util.util import get_tmp_path
+
+# A pack holds all the preview frames of a stock in a single file:
+#
+#   header:   magic, version, amount of frames
+#   table:    frame number, offset and size of every frame
+#   frames:   the JPEG data of every frame, one after the other
+
+extension = 'pack'
+magic = b'SMPK'
+version = 1
+
+header_struct = struct.Struct('<4sHI')
+entry_struct = struct.Struct('<IQI')
+
+
+def is_packed(indexed):
+    return indexed.endswith('.' + extension)
+
+
+def get_frame_number(filename):
+    name = filename.rsplit('.', 1)[0]
+    number = name.rsplit('_', 1)[-1]
+
+    return int(number) if number.isdigit() else 0
+
+
+def get_frame_files(directory):
+    # {frame number: path} of the frames of a preview directory, sorted by
+    # frame, whatever the name of its frames
+    frames = OrderedDict()
+
+    try:
+        filenames = os.listdir(directory)
+    except OSError:
+        return frames
+
+    for f in sorted(filenames, key=get_frame_number):
+        frames[get_frame_number(f)] = '{}/{}'.format(directory, f)
+
+    return frames
+
+
+def pack(directory, pack_file=None):
+    # packs the frames of a preview directory and deletes the directory
+    if not pack_file:
+        pack_file = '{}.{}'.format(directory, extension)
+
+    frames = sorted(os.listdir(directory), key=get_frame_number)
+
+    table_size = header_struct.size + entry_struct.size * len(frames)
+
+    entries = []
+    offset = table_size
+
+    for f in frames:
+        size = os.path.getsize(os.path.join(directory, f))
+        entries.append((get_frame_number(f), offset, size))
+        offset += size
+
+    tmp_file = get_tmp_path(pack_file)
+
+    with open(tmp_file, 'wb') as pack_data:
+        pack_data.write(header_struct.pack(magic, version, len(frames)))
+
+        for entry in entries:
+            pack_data.write(entry_struct.pack(*entry))
+
+        for f in frames:
+            with open(os.path.join(directory, f), 'rb') as frame_data:
+                shutil.copyfileobj(frame_data, pack_data)
+
+    os.rename(tmp_file, pack_file)
+    shutil.rmtree(directory)
+
+    return pack_file
+
+
+def unpack(pack_file, directory, name):
+    # writes the frames of the pack as 'name_<frame>.jpg', like the converter
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    reader = pack_reader(pack_file)
+    files = []
+
+    for frame in reader.get_frames():
+        filename = '{}/{}_{}.jpg'.format(directory, name, frame)
+
+        with open(filename, 'wb') as f:
+            f.write(reader.get(frame))
+
+        files.append(filename)
+
+    reader.close()
+
+    return files
+
+
+class pack_reader():
+    def __init__(self, pack_file):
+        self.file = open(pack_file, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        _magic, _, count = header_struct.unpack_from(self.data, 0)
+        if not _magic == magic:
+            self.close()
+            raise ValueError('Not a preview pack: {}'.format(pack_file))
+
+        self.entries = {}
+        self.frames = []
+
+        for i in range(count):
+            frame, offset, size = entry_struct.unpack_from(
+                self.data, header_struct.size + i * entry_struct.size)
+
+            self.entries[frame] = (offset, size)
+            self.frames.append(frame)
+
+    def get_frames(self):
+        return self.frames
+
+    def get(self, frame):
+        if not frame in self.entries:
+            return None
+
+        offset, size = self.entries[frame]
+        return self.data[offset: offset + size]
+
+    def get_middle(self):
+        if not self.frames:
+            return None
+
+        return self.get(self.frames[int(len(self.frames) / 2)])
+
+    def close(self):
+        if self.data:
+            self.data.close()
+            self.data = None
+
+        self.file.close()
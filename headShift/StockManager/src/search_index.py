@@ -0,0 +1,196 @@
+# Author: Francisco Jose Contreras Cuevas
+# Office: VFX Artist - Senior Compositor
+# Website: vinavfx.com
+import os
+import threading
+from collections import defaultdict
+
+# Inverted index of the indexed stocks, so the filters and the search box
+# do not go through every stock:
+#
+#   - postings by folder, element, type and texture/stock
+#   - postings by every 3 characters of element, type and name, a keyword
+#     is looked up by intersecting the postings of its trigrams
+#   - facet counts by texture, folder, element and type, for the combos
+
+gram_size = 3
+
+
+def get_grams(text):
+    return set([text[i: i + gram_size] for i in range(len(text) - gram_size + 1)])
+
+
+def get_search_text(stock):
+    return '{}\n{}\n{}'.format(stock['element'], stock['type'], stock['name'].lower())
+
+
+class search_index():
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.next_id = 0
+            self.ids = {}
+            self.paths = {}
+            self.texts = {}
+            self.keys = {}
+
+            self.postings = defaultdict(set)
+            self.grams = defaultdict(set)
+
+            # texture -> folder -> element -> type -> amount
+            self.facets = defaultdict(lambda: defaultdict(
+                lambda: defaultdict(lambda: defaultdict(int))))
+
+    def build(self, stocks):
+        with self.lock:
+            self.clear()
+
+            for _, stock in stocks.items():
+                self.add(stock)
+
+    def get_keys(self, stock):
+        return (
+            stock['frames'] == 1,
+            os.path.basename(stock['folder']),
+            stock['element'],
+            stock['type']
+        )
+
+    def add(self, stock):
+        with self.lock:
+            path = stock['path']
+
+            if path in self.ids:
+                # keeps the position of the stock, as the catalog does
+                _id = self.ids[path]
+                self.remove(path)
+            else:
+                _id = self.next_id
+                self.next_id += 1
+
+            keys = self.get_keys(stock)
+            texture, folder, element, _type = keys
+            text = get_search_text(stock)
+
+            self.ids[path] = _id
+            self.paths[_id] = path
+            self.texts[_id] = text
+            self.keys[_id] = keys
+
+            self.postings[('texture', texture)].add(_id)
+            self.postings[('folder', folder)].add(_id)
+            self.postings[('element', element)].add(_id)
+            self.postings[('type', _type)].add(_id)
+
+            for gram in get_grams(text):
+                self.grams[gram].add(_id)
+
+            self.facets[texture][folder][element][_type] += 1
+
+    def remove(self, path):
+        with self.lock:
+            _id = self.ids.pop(path, None)
+            if _id is None:
+                return
+
+            del self.paths[_id]
+            text = self.texts.pop(_id)
+            keys = self.keys.pop(_id)
+            texture, folder, element, _type = keys
+
+            for key in [('texture', texture), ('folder', folder), ('element', element), ('type', _type)]:
+                self.postings[key].discard(_id)
+
+            for gram in get_grams(text):
+                self.grams[gram].discard(_id)
+
+            types = self.facets[texture][folder][element]
+            types[_type] -= 1
+
+            if not types[_type]:
+                del types[_type]
+
+    def get_ids(self, keyword='', folder='', element='', _type='', textures=None):
+        # an empty filter or 'all' matches everything
+        sets = []
+
+        if not textures is None:
+            sets.append(self.postings[('texture', textures)])
+
+        if folder and not folder.lower() == 'all':
+            sets.append(self.postings[('folder', folder)])
+
+        if element and not element.lower() == 'all':
+            sets.append(self.postings[('element', element.lower())])
+
+        if _type and not _type.lower() == 'all':
+            sets.append(self.postings[('type', _type.lower())])
+
+        if len(keyword) >= gram_size:
+            for gram in get_grams(keyword):
+                sets.append(self.grams.get(gram, set()))
+
+        if sets:
+            sets.sort(key=len)
+            ids = set(sets[0])
+
+            for s in sets[1:]:
+                ids &= s
+                if not ids:
+                    break
+        else:
+            ids = set(self.paths)
+
+        if keyword:
+            # the grams only give candidates, they are not in order
+            ids = [i for i in ids if keyword in self.texts[i]]
+
+        return ids
+
+    def query(self, limit=-1, **filters):
+        with self.lock:
+            ids = sorted(self.get_ids(**filters))
+            total = len(ids)
+
+            if limit >= 0:
+                ids = ids[:limit]
+
+            return [self.paths[i] for i in ids], total
+
+    def facet_counts(self, column, folder='', element='', textures=None):
+        # amount of stocks by value of 'column' (folder, element or type),
+        # it only goes through the facets, not through the stocks
+        counts = defaultdict(int)
+
+        def match(value, current):
+            return not current or current.lower() == 'all' or value == current
+
+        with self.lock:
+            for texture, folders in self.facets.items():
+                if not textures is None and not texture == textures:
+                    continue
+
+                for folder_name, elements in folders.items():
+                    if column == 'folder':
+                        for _, types in elements.items():
+                            counts[folder_name] += sum(types.values())
+                        continue
+
+                    if not match(folder_name, folder):
+                        continue
+
+                    for element_name, types in elements.items():
+                        if column == 'element':
+                            counts[element_name] += sum(types.values())
+                            continue
+
+                        if not match(element_name, element.lower()):
+                            continue
+
+                        for type_name, amount in types.items():
+                            counts[type_name] += amount
+
+        return dict([(k, v) for k, v in counts.items() if v])
@@ -2,6 +2,7 @@
 # Office: VFX Artist - Senior Compositor
 # Website: vinavfx.com
 import nuke
+import threading
 
 from PySide2.QtWidgets import (QWidget, QVBoxLayout, QTabWidget, QHBoxLayout, QLabel)
 
@@ -23,13 +24,18 @@ class status_bar(QWidget):
 
         self.total_label = QLabel()
         self.indexing_stock = QLabel()
+        self.indexing_progress = QLabel()
         self.current_stock = QLabel()
         self.visibles_label = QLabel()
 
+        # progress of the stocks being converted, by path
+        self.converting = {}
+
         layout.addWidget(self.current_stock)
         layout.addStretch()
         layout.addWidget(self.total_label)
         layout.addWidget(self.indexing_stock)
+        layout.addWidget(self.indexing_progress)
         layout.addStretch()
         layout.addWidget(self.visibles_label)
 
@@ -37,6 +43,8 @@ class status_bar(QWidget):
     def set_indexing_stock(self, stock_name, percent=0):
         if stock_name == 'finished':
             self.indexing_stock.setText('')
+            self.indexing_progress.setText('')
+            self.converting = {}
             return
 
         if stock_name == 'analyzing':
@@ -48,6 +56,37 @@ class status_bar(QWidget):
         text = '( {} )'.format(text)
         self.indexing_stock.setText(text)
 
+    def set_indexing_progress(self, progress):
+        # the label follows the oldest stock being converted until it
+        # finishes, instead of jumping between the stocks
+        if progress['finished']:
+            self.converting.pop(progress['path'], None)
+        else:
+            self.converting[progress['path']] = progress
+
+        if not self.converting:
+            self.indexing_progress.setText('')
+            return
+
+        progress = next(iter(self.converting.values()))
+
+        eta = int(progress['eta'])
+        eta_text = '{}:{:02d}'.format(int(eta / 60), eta % 60) if eta >= 0 else '-'
+
+        text = '{} <font color="#64C8FA">{}/{}</font> frames - {:.1f} fps - {:.1f} MB/s - {}'.format(
+            progress['name'], progress['frame'], progress['frames'],
+            progress['fps'], progress['mb_per_second'], eta_text)
+
+        if len(self.converting) > 1:
+            text += ' <font color="#c4c4c4">+{} more</font>'.format(len(self.converting) - 1)
+
+        self.indexing_progress.setText('[ {} ]'.format(text))
+
+    def set_loading_stocks(self, loaded, total):
+        self.total_label.setText(
+            '<font color="#fcba03">Loading:</font> <font color="#64C8FA">{} / {}</font> stocks'.format(
+                loaded, total))
+
     def set_total_stocks(self, total):
         self.total_label.setText(
             'Total: <font color="#64C8FA">{}</font> stocks'.format(total))
@@ -98,7 +137,9 @@ class stock_manager_widget(panel_widget):
     def setup(self):
         self.mounted = True
 
-        indexing.load_data()
+        # only the first page of the catalog, the panel is usable while the
+        # rest is loaded
+        indexing.load_data(lazy=True)
 
         layout = QVBoxLayout()
         layout.setMargin(0)
@@ -134,6 +175,20 @@ class stock_manager_widget(panel_widget):
 
         self.setLayout(layout)
 
+        threading.Thread(target=self.load_stocks_thread,
+                         args=(_stocks, _status_bar)).start()
+
+    def load_stocks_thread(self, _stocks, _status_bar):
+        def page_fn(loaded, total):
+            nuke.executeInMainThread(
+                _status_bar.set_loading_stocks, (loaded, total))
+
+        indexing.load_remaining_stocks(page_fn)
+
+        nuke.executeInMainThread(
+            _status_bar.set_total_stocks, (indexing.get_total_stocks(),))
+        nuke.executeInMainThread(_stocks.filter_widget_update)
+
     def showEvent(self, _):
         if not self.mounted:
             self.setup()
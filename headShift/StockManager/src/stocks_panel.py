@@ -2,31 +2,336 @@
 # Office: VFX Artist - Senior Compositor
 # Website: vinavfx.com
 import os
-import json
+import tempfile
+import threading
 from functools import partial
 from time import time
 from sys import version_info
 
 import nuke
 
-from PySide2.QtCore import (Qt, QSortFilterProxyModel, QSize)
-from PySide2.QtGui import (QIcon, QStandardItemModel)
-from PySide2.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QLineEdit,
-                               QComboBox, QListView, QAbstractItemView, QListWidget, QListWidgetItem, QSpinBox,
-                               QMenu, QAction)
+from PySide2.QtCore import (Qt, QSize, QRect, QMimeData, QAbstractListModel, QModelIndex, QTimer)
+from PySide2.QtGui import (QIcon, QColor, QFont, QFontMetrics)
+from PySide2.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLineEdit,
+                               QComboBox, QListView, QAbstractItemView, QMenu, QAction,
+                               QStyledItemDelegate, QStyleOptionViewItem, QStyle, QApplication)
 
 from ..nuke_util.nuke_util import get_nuke_path
 from .player_panel import slider
 from . import indexing
+from . import preview_pack
+from .thumbnail_loader import thumbnail_loader
 
 
-class stock_view(QListWidget):
+def get_filename(stock):
+    filename = stock['path']
+    indexed = stock['indexed']
+
+    if os.path.isdir(os.path.dirname(filename)):
+        filename = '{} {}-{}'.format(filename,
+                                     stock['first_frame'], stock['last_frame'])
+        return filename
+
+    if preview_pack.is_packed(indexed):
+        # nuke can not read a pack, so the preview is extracted to a temp dir
+        tmp_dir = os.path.join(tempfile.gettempdir(), 'stock_manager',
+                               indexing.get_preview_name(indexed)).replace('\\', '/')
+
+        if not os.path.isdir(tmp_dir):
+            preview_pack.unpack(indexed, tmp_dir, stock['name'])
+
+        indexed = tmp_dir
+
+    filename = os.path.join(indexed, nuke.getFileNameList(indexed)[0])
+
+    return filename
+
+
+def get_tooltip(stock):
+    width, height = stock['resolution']
+
+    return (
+        'Element: {}\n'
+        'Type: {}\n'
+        'Frames: {}\n'
+        'Resolution: {}'
+
+    ).format(
+        stock['element'].capitalize(),
+        stock['type'].capitalize(),
+        stock['frames'],
+        '{} x {}'.format(width, height)
+    )
+
+
+# rows given to the view at a time, the next ones when it scrolls to the end
+fetch_size = 1000
+
+
+class stock_model(QAbstractListModel):
+    # only holds the stocks that pass the filters, the view asks for the
+    # data of the visible rows only
     def __init__(self, parent=None):
-        QListWidget.__init__(self, parent)
+        QAbstractListModel.__init__(self, parent)
+
+        self.stocks = []
+        self.paths = []
+        self.fetched = 0
+
+        # rows waiting for their thumbnail
+        self.waiting_rows = {}
+
+        # pixels of the icons, the thumbnails of the previous size are shown
+        # while the ones of the new size are loading
+        self.thumbnail_size = 0
+        self.previous_thumbnail_size = 0
+
+        self.thumbnails = thumbnail_loader(parent=self)
+        self.thumbnails.loaded.connect(self.thumbnail_loaded)
+
+    def set_stocks(self, stocks):
+        paths = [stock['path'] for stock in stocks]
+
+        if self.paths and paths[:len(self.paths)] == self.paths:
+            # the same stocks followed by others, like when the catalog
+            # finishes loading, the view keeps its rows and its scroll
+            self.stocks = stocks
+            self.paths = paths
+
+            if self.fetched:
+                self.dataChanged.emit(self.index(0), self.index(self.fetched - 1))
+
+            if self.fetched < fetch_size and self.canFetchMore(QModelIndex()):
+                self.fetchMore(QModelIndex())
+
+            return
+
+        self.beginResetModel()
+        self.stocks = stocks
+        self.paths = paths
+        self.fetched = min(len(stocks), fetch_size)
+        self.waiting_rows = {}
+        self.thumbnails.cancel_pending()
+        self.endResetModel()
+
+    def canFetchMore(self, parent):
+        if parent.isValid():
+            return False
+
+        return self.fetched < len(self.stocks)
+
+    def fetchMore(self, parent):
+        if parent.isValid():
+            return
+
+        amount = min(fetch_size, len(self.stocks) - self.fetched)
+        if amount <= 0:
+            return
+
+        self.beginInsertRows(QModelIndex(), self.fetched, self.fetched + amount - 1)
+        self.fetched += amount
+        self.endInsertRows()
+
+    def clear_icons(self):
+        self.thumbnails.clear()
+
+    def set_thumbnail_size(self, size):
+        tier = indexing.get_thumbnail_tier(size)
+
+        if self.thumbnail_size and tier == indexing.get_thumbnail_tier(self.thumbnail_size):
+            self.thumbnail_size = size
+            return
+
+        self.previous_thumbnail_size = self.thumbnail_size
+        self.thumbnail_size = size
+
+        self.waiting_rows = {}
+        self.thumbnails.cancel_pending()
+
+        if self.fetched:
+            self.dataChanged.emit(self.index(0), self.index(
+                self.fetched - 1), [Qt.DecorationRole])
+
+    def reload_thumbnails(self, index):
+        # the tiers shown from the small thumbnail while the stock had no
+        # preview are made from the preview
+        indexed = self.get_stock(index)['indexed']
+
+        self.thumbnails.forget([indexing.get_thumbnail(indexed, tier)
+                                for tier in indexing.thumbnail_tiers])
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def thumbnail_loaded(self, thumbnail):
+        for row in self.waiting_rows.pop(thumbnail, []):
+            if row >= self.fetched:
+                continue
+
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def get_stock(self, index):
+        return self.stocks[index.row()]
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return self.fetched
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        stock = self.stocks[index.row()]
+
+        if role == Qt.DisplayRole:
+            return stock['name']
+
+        if role == Qt.UserRole:
+            return stock
+
+        if role == Qt.ToolTipRole:
+            return get_tooltip(stock)
+
+        if role == Qt.DecorationRole:
+            indexed = stock['indexed']
+            thumbnail = indexing.get_thumbnail(indexed, self.thumbnail_size)
+
+            if not self.thumbnails.is_loaded(thumbnail):
+                rows = self.waiting_rows.setdefault(thumbnail, [])
+                if not index.row() in rows:
+                    rows.append(index.row())
+
+            fallback = None
+            if self.previous_thumbnail_size:
+                fallback = indexing.get_thumbnail(indexed, self.previous_thumbnail_size)
+
+            return self.thumbnails.get(thumbnail, indexed, self.thumbnail_size, fallback)
+
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsDragEnabled
+
+    def mimeTypes(self):
+        return ['text/plain']
+
+    def mimeData(self, indexes):
+        mime_data = QMimeData()
+
+        if indexes:
+            mime_data.setText(get_filename(self.stocks[indexes[0].row()]))
+
+        return mime_data
+
+
+class stock_delegate(QStyledItemDelegate):
+    def __init__(self, view):
+        QStyledItemDelegate.__init__(self, view)
+
+        self.view = view
+        self.grid_mode = False
+        self.data_color = QColor('#64C8FA')
+        self.frames_color = QColor('#ffbb00')
+
+    def sizeHint(self, option, index):
+        size = self.view.iconSize()
+
+        if self.grid_mode:
+            return QSize(size.width() + 8, size.height() + 8)
+
+        return QSize(option.rect.width(), max(30, size.height() + 4))
+
+    def draw_text(self, painter, rect, text, color=None, bold=False, italic=False, align=Qt.AlignLeft):
+        font = QFont(painter.font())
+        font.setBold(bold)
+        font.setItalic(italic)
+
+        painter.setFont(font)
+        if color:
+            painter.setPen(color)
+
+        painter.drawText(rect, align | Qt.AlignVCenter, text)
+
+        return QFontMetrics(font).horizontalAdvance(text)
+
+    def paint(self, painter, option, index):
+        stock = self.view.stock_model.get_stock(index)
+
+        opt = QStyleOptionViewItem(option)
+        self.initStyleOption(opt, index)
+
+        style = opt.widget.style() if opt.widget else QApplication.style()
+        style.drawPrimitive(QStyle.PE_PanelItemViewItem, opt, painter, opt.widget)
+
+        painter.save()
+
+        rect = opt.rect
+        size = self.view.iconSize()
+        icon = index.data(Qt.DecorationRole)
+
+        if self.grid_mode:
+            icon.paint(painter, rect, Qt.AlignCenter)
+            painter.restore()
+            return
+
+        icon_rect = QRect(rect.x() + 2, rect.y(), size.width(), rect.height())
+        icon.paint(painter, icon_rect, Qt.AlignCenter)
+
+        text_rect = rect.adjusted(size.width() + 8, 0, -5, 0)
+        text_color = opt.palette.text().color()
+
+        element = stock['element']
+        _type = stock['type']
+        frames = stock['frames']
+        width, height = stock['resolution']
+
+        data_element = '' if element == 'not labeled' else '{} - '.format(
+            element.capitalize())
+        data_type = '' if _type == 'not labeled' else '{} - '.format(
+            _type.capitalize())
+
+        x = text_rect.x()
+
+        for text, color, bold, italic in [
+            ('{} - '.format(stock['name']), text_color, False, False),
+            (data_element + data_type, self.data_color, True, False),
+            ('{}x{}'.format(width, height), self.data_color, False, True)
+        ]:
+            x += self.draw_text(painter, QRect(x, text_rect.y(), text_rect.right() - x,
+                                               text_rect.height()), text, color, bold, italic)
+
+        if frames == 1:
+            self.draw_text(painter, text_rect, '|||',
+                           text_color, align=Qt.AlignRight)
+        else:
+            frames_width = self.draw_text(
+                painter, text_rect, ' frames', text_color, align=Qt.AlignRight)
+
+            self.draw_text(painter, text_rect.adjusted(0, 0, -frames_width, 0), str(frames),
+                           self.frames_color, bold=True, align=Qt.AlignRight)
+
+        painter.restore()
+
+
+class stock_view(QListView):
+    def __init__(self, parent=None):
+        QListView.__init__(self, parent)
 
         self.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.setAlternatingRowColors(True)
         self.setSelectionMode(QListView.ExtendedSelection)
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QListView.Batched)
+
+        self.stock_model = stock_model(self)
+        self.setModel(self.stock_model)
+
+        self.delegate = stock_delegate(self)
+        self.setItemDelegate(self.delegate)
 
         style = """
             QTreeWidget::item:selected,
@@ -35,11 +340,6 @@ class stock_view(QListWidget):
                 background: rgba(255,150,0, .1);
                 color: rgb(200, 200, 200);
             }
-
-            QListView::item
-            {
-                min-height: 30px;
-            }
         """
 
         self.setStyleSheet(style)
@@ -57,12 +357,16 @@ class stock_view(QListWidget):
         self.context_menu.exec_(self.mapToGlobal(pos))
 
     def add_stocks(self):
-        for item in self.selectedItems():
-            filename = self.get_filename(item)
+        for index in self.selectedIndexes():
+            filename = get_filename(self.stock_model.get_stock(index))
             self.create_read(filename)
 
     def mouseDoubleClickEvent(self, _):
-        filename = self.get_filename(self.currentIndex())
+        index = self.currentIndex()
+        if not index.isValid():
+            return
+
+        filename = get_filename(self.stock_model.get_stock(index))
         self.create_read(filename)
 
     def create_read(self, filename):
@@ -75,22 +379,7 @@ class stock_view(QListWidget):
 
         nuke.nodes.Read(file=file_path, first=first_frame, last=last_frame)
 
-    def get_filename(self, item):
-        item_data = json.loads(item.data(4))
-
-        filename = item_data['path']
-        indexed = item_data['indexed']
-
-        if os.path.isdir(os.path.dirname(filename)):
-            filename = '{} {}-{}'.format(filename,
-                                         item_data['first_frame'], item_data['last_frame'])
-        else:
-            filename = os.path.join(indexed, nuke.getFileNameList(indexed)[0])
-
-        return filename
-
     def dragEnterEvent(self, event):
-        event.mimeData().setText(self.get_filename(self.currentIndex()))
         event.accept()
 
     def dropEvent(self, _):
@@ -99,28 +388,31 @@ class stock_view(QListWidget):
     def set_view_mode(self, grid_mode):
         mode = QListView.IconMode if grid_mode else QListView.ListMode
         self.setViewMode(mode)
+        self.delegate.grid_mode = grid_mode
 
+        self.setMovement(QListView.Static)
+        self.setResizeMode(QListView.Adjust)
         self.setAcceptDrops(False)
 
         if version_info.major == 3:
             self.setDragEnabled(True)
-            self.setDragDropMode(QAbstractItemView.DragDrop)
+            self.setDragDropMode(QAbstractItemView.DragOnly)
 
         self.setDropIndicatorShown(False)
         self.setAlternatingRowColors(not grid_mode)
 
-        if grid_mode:
-            self.setStyleSheet('QLabel {max-height: 0px;}')
-        else:
-            self.setStyleSheet('QLabel {max-height: 10000px;}')
-
     def set_size(self, percent):
         min_size = 50
         max_size = 120
 
-        size = ((max_size - min_size) * percent / 100) + min_size
+        size = int(((max_size - min_size) * percent / 100) + min_size)
         self.setIconSize(QSize(size, size))
 
+        # the thumbnails are loaded at the pixels of the screen
+        self.stock_model.set_thumbnail_size(int(size * self.devicePixelRatioF()))
+
+        self.scheduleDelayedItemsLayout()
+
 
 class stocks(QWidget):
     def __init__(self, player, status_bar):
@@ -131,10 +423,6 @@ class stocks(QWidget):
         layout = QVBoxLayout()
         self.setLayout(layout)
 
-        self.viewerModel = QStandardItemModel()
-        self.viewerProxyModel = QSortFilterProxyModel()
-        self.viewerProxyModel.setSourceModel(self.viewerModel)
-
         self.list_widget = stock_view()
         self.list_widget.selectionModel().selectionChanged.connect(self.clicked_item)
 
@@ -157,8 +445,14 @@ class stocks(QWidget):
         self.type_filter.setToolTip('Type Filter')
         self.type_filter.currentTextChanged.connect(self.filter_widget_update)
 
+        # the search waits until typing pauses
+        self.search_timer = QTimer()
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(200)
+        self.search_timer.timeout.connect(self.filter_update)
+
         self.search_filter = QLineEdit()
-        self.search_filter.textChanged.connect(self.filter_update)
+        self.search_filter.textChanged.connect(lambda: self.search_timer.start())
         self.search_filter.setPlaceholderText('Search Element')
 
         self.stock_filter = QComboBox()
@@ -181,13 +475,6 @@ class stocks(QWidget):
         self.size_slider.setToolTip('Display Size')
         self.size_slider.valueChanged.connect(self.set_size)
 
-        self.max_visibility = QSpinBox()
-        self.max_visibility.setValue(50)
-        self.max_visibility.setMinimum(1)
-        self.max_visibility.setMaximum(2500)
-        self.max_visibility.setMaximumWidth(100)
-        self.max_visibility.setToolTip('Max Visibility: between 1 and 2500')
-
         self.list_display = QPushButton()
         self.list_display.setCheckable(True)
         self.list_display.clicked.connect(
@@ -214,7 +501,6 @@ class stocks(QWidget):
         display_layout.addSpacing(30)
         display_layout.addWidget(self.size_slider)
         display_layout.addSpacing(30)
-        display_layout.addWidget(self.max_visibility)
         display_layout.addWidget(self.refresh_btn)
 
         layout.addWidget(filter_widget)
@@ -242,76 +528,64 @@ class stocks(QWidget):
         self.list_display.setChecked(not grid)
         self.list_widget.set_view_mode(grid)
 
-    def filter_widget_update(self):
-        if not self.update_filter:
-            return
-
-        self.update_filter = False
-
-        current_folder = self.index_folder_filter.currentText()
-        current_element = self.element_filter.currentText()
-        current_type = self.type_filter.currentText()
+    def get_textures_filter(self):
         current_stock = self.stock_filter.currentText()
 
-        self.index_folder_filter.clear()
-        self.element_filter.clear()
-        self.type_filter.clear()
+        if current_stock == 'Textures':
+            return True
 
-        folder_items = []
-        element_items = []
-        type_items = []
+        if current_stock == 'Stocks':
+            return False
 
-        element_stocks = []
+        return None
 
-        for _, stock in indexing.get_indexed_stocks().items():
-            folder_name = os.path.basename(stock['folder'])
+    def set_combo_items(self, combo, counts, current, capitalize=True):
+        # the combo shows the amount of stocks and keeps the value as data
+        combo.clear()
+        combo.addItem('All', 'All')
 
-            is_texture = stock['frames'] == 1
-            if current_stock == 'Textures' and not is_texture:
-                continue
+        for value in sorted(counts):
+            label = value.capitalize() if capitalize else value
+            combo.addItem('{} ({})'.format(label, counts[value]), label)
 
-            if current_stock == 'Stocks' and is_texture:
-                continue
+        index = combo.findData(current)
+        combo.setCurrentIndex(index if index >= 0 else 0)
 
-            if not folder_name in folder_items:
-                folder_items.append(folder_name)
+    def get_combo_value(self, combo):
+        value = combo.currentData()
+        return value if value else 'All'
 
-            if current_folder and not folder_name == current_folder and not current_folder == 'All':
-                continue
+    def filter_widget_update(self):
+        if not self.update_filter:
+            return
 
-            element = stock['element'].capitalize()
-            if not element in element_items:
-                element_items.append(element)
+        self.update_filter = False
 
-            element_stocks.append(stock)
+        current_folder = self.get_combo_value(self.index_folder_filter)
+        current_element = self.get_combo_value(self.element_filter)
+        current_type = self.get_combo_value(self.type_filter)
+        textures = self.get_textures_filter()
 
-        if not current_element in element_items:
-            current_element = 'All'
+        folder_counts = indexing.get_facet_counts(
+            'folder', textures=textures)
 
-        for stock in element_stocks:
-            if current_element:
-                if not current_element.lower() == stock['element'] and not current_element == 'All':
-                    continue
+        if not current_folder in folder_counts:
+            current_folder = 'All'
 
-            _type = stock['type'].capitalize()
-            if not _type in type_items:
-                type_items.append(_type)
+        element_counts = indexing.get_facet_counts(
+            'element', folder=current_folder, textures=textures)
 
-        folder_items = sorted(folder_items)
-        element_items = sorted(element_items)
-        type_items = sorted(type_items)
-
-        folder_items.insert(0, 'All')
-        element_items.insert(0, 'All')
-        type_items.insert(0, 'All')
+        if not current_element.lower() in element_counts:
+            current_element = 'All'
 
-        self.index_folder_filter.addItems(folder_items)
-        self.element_filter.addItems(element_items)
-        self.type_filter.addItems(type_items)
+        type_counts = indexing.get_facet_counts(
+            'type', folder=current_folder, element=current_element, textures=textures)
 
-        self.index_folder_filter.setCurrentText(current_folder)
-        self.element_filter.setCurrentText(current_element)
-        self.type_filter.setCurrentText(current_type)
+        self.set_combo_items(self.index_folder_filter,
+                             folder_counts, current_folder, False)
+        self.set_combo_items(self.element_filter,
+                             element_counts, current_element)
+        self.set_combo_items(self.type_filter, type_counts, current_type)
 
         self.update_filter = True
         self.filter_update()
@@ -320,144 +594,19 @@ class stocks(QWidget):
         if not self.update_filter:
             return
 
-        keyword = self.search_filter.text().lower()
-        index_folder = self.index_folder_filter.currentText()
-        element_stock = self.element_filter.currentText().lower()
-        type_stock = self.type_filter.currentText().lower()
-        stock_filter = self.stock_filter.currentText().lower()
-
-        total_visibles = 0
-
-        for _, stock in indexing.get_indexed_stocks().items():
-            hide = True
-
-            if stock['element'] == element_stock or element_stock == 'all':
-                if stock['type'] == type_stock or type_stock == 'all':
-                    if index_folder in stock['folder'] or index_folder == 'All':
-                        hide = False
-
-            if not hide:
-                if (not keyword in stock['element'] and
-                    not keyword in stock['type'] and
-                        not keyword in stock['name'].lower()):
-
-                    hide = True
-
-            if not hide and not stock_filter == 'all':
-                is_texture = stock['frames'] == 1
-                if stock_filter == 'textures' and not is_texture:
-                    hide = True
-
-                if stock_filter == 'stocks' and is_texture:
-                    hide = True
-
-            stock['hide'] = hide
-
-            if not hide:
-                total_visibles += 1
-
-            if not 'item' in stock:
-                continue
-
-            stock['item'].setHidden(True)
-
-        _max = self.max_visibility.value()
-        i = 0
-        showed = 0
-
-        self.list_widget.setVisible(False)
-
-        for _, stock in indexing.get_indexed_stocks().items():
-            if stock['hide']:
-                continue
-
-            i += 1
-            if i > _max:
-                break
-
-            self.mount_item(stock)
-            stock['item'].setHidden(False)
-            showed += 1
-
-        self.status_bar.set_visibles_label(showed, total_visibles)
-        self.list_widget.setVisible(True)
-
-    def mount_item(self, stock):
-        if stock['mounted']:
-            return
-
-        stock['mounted'] = True
-        indexed = stock['indexed']
-        path = stock['path']
-        name = stock['name']
-        element = stock['element']
-        _type = stock['type']
-        frames = stock['frames']
-        width, height = stock['resolution']
-        item = stock['item']
-
-        self.list_widget.addItem(item)
-
-        frame = '{}/{}.jpg'.format(indexing.thumbnails_folder,
-                                   os.path.basename(indexed))
-        icon = QIcon(frame)
-        item.setIcon(icon)
-
-        item_data = {
-            'name': name,
-            'indexed': indexed,
-            'path': path,
-            'frames': frames,
-            'first_frame': stock['first_frame'],
-            'last_frame': stock['last_frame'],
-            'element': element,
-            'type': _type,
-            'resolution': [width, height]
-        }
-        item.setData(4, json.dumps(item_data))
-
-        tooltip = (
-            'Element: {}\n'
-            'Type: {}\n'
-            'Frames: {}\n'
-            'Resolution: {}'
-
-        ).format(
-            element.capitalize(),
-            _type.capitalize(),
-            frames,
-            '{} x {}'.format(width, height)
+        paths, total_visibles = indexing.query_stocks(
+            keyword=self.search_filter.text().lower(),
+            folder=self.get_combo_value(self.index_folder_filter),
+            element=self.get_combo_value(self.element_filter),
+            _type=self.get_combo_value(self.type_filter),
+            textures=self.get_textures_filter()
         )
-        item.setToolTip(tooltip)
 
-        label = QLabel()
+        stocks = indexing.get_indexed_stocks()
+        visibles = [stocks[path] for path in paths if path in stocks]
 
-        data_element = '' if element == 'not labeled' else '{} - '.format(
-            element.capitalize())
-        data_type = '' if _type == 'not labeled' else '{} - '.format(
-            _type.capitalize())
-
-        data_text = '<font color="#64C8FA"><b>{}{}</b><i>{}x{}</i></font>'.format(
-            data_element, data_type, width, height)
-
-        left_text = '{} - {}'.format(name, data_text)
-        right_text = '<font color="#ffbb00"><b>{}</b></font> frames'.format(
-            frames)
-
-        if frames == 1:
-            right_text = '<font size=4>|||</font>'
-
-        text = '<td style="vertical-align: middle;" width="50%" align="left">{}</td><td width="50%" align="right">{}</td>'.format(
-            left_text, right_text)
-
-        label.setStyleSheet(
-            'QLabel {margin-left: 2px; margin-right: 5px;}')
-        label.setText(text)
-        label.setAlignment(Qt.AlignCenter | Qt.AlignCenter)
-
-        label.setAttribute(Qt.WA_TransparentForMouseEvents)
-
-        self.list_widget.setItemWidget(item, label)
+        self.list_widget.stock_model.set_stocks(visibles)
+        self.status_bar.set_visibles_label(len(visibles), total_visibles)
 
     def clear_and_refresh(self):
         self.refresh_stocks(True)
@@ -466,16 +615,7 @@ class stocks(QWidget):
         t = time()
 
         if clear:
-            self.list_widget.clear()
-
-        for _, stock in indexing.get_indexed_stocks().items():
-            if 'item' in stock and not clear:
-                continue
-
-            item = QListWidgetItem()
-            stock['mounted'] = False
-            stock['item'] = item
-            stock['hide'] = True
+            self.list_widget.stock_model.clear_icons()
 
         self.set_size(self.current_size, True)
         self.set_grid_display(self.is_grid_display)
@@ -484,9 +624,31 @@ class stocks(QWidget):
         print('Refreshed in {} seconds.'.format(round(time() - t, 2)))
 
     def clicked_item(self):
-        item = self.list_widget.currentIndex()
+        index = self.list_widget.currentIndex()
+        if not index.isValid():
+            return
+
+        stock = self.list_widget.stock_model.get_stock(index)
+        self.status_bar.set_current_stock(stock)
+
+        if not indexing.preview_exists(stock['indexed']) and indexing.is_evicted(stock['indexed']):
+            # the preview was removed to keep the store within its budget
+            threading.Thread(target=self.restore_preview, args=(stock,)).start()
+            return
+
+        self.player.set_path(stock['name'], stock['indexed'],
+                             stock['frames'], stock['resolution'])
+
+    def restore_preview(self, stock):
+        if indexing.restore_preview(stock):
+            nuke.executeInMainThread(self.preview_restored, (stock,))
+
+    def preview_restored(self, stock):
+        index = self.list_widget.currentIndex()
+        if not index.isValid() or not self.list_widget.stock_model.get_stock(index) is stock:
+            return
+
+        self.list_widget.stock_model.reload_thumbnails(index)
 
-        item_data = json.loads(item.data(4))
-        self.status_bar.set_current_stock(item_data)
-        self.player.set_path(item_data['name'], item_data['indexed'],
-                             item_data['frames'], item_data['resolution'])
+        self.player.set_path(stock['name'], stock['indexed'],
+                             stock['frames'], stock['resolution'])
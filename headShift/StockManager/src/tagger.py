@@ -0,0 +1,85 @@
+# Author: Francisco Jose Contreras Cuevas
+# Office: VFX Artist - Senior Compositor
+# Website: vinavfx.com
+from collections import deque
+
+
+class tagger():
+    # Aho-Corasick automaton of the tags, it finds every tag contained in a
+    # name in a single pass over the name, whatever the amount of tags.
+    def __init__(self, tags):
+        self.tags = []
+
+        # by node: transitions, fail link and tags that end in the node
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for tag in tags:
+            tag = tag.lower()
+            if not tag or tag in self.tags:
+                continue
+
+            self.tags.append(tag)
+            self.add(tag, len(self.tags) - 1)
+
+        self.build()
+
+    def add(self, tag, tag_index):
+        node = 0
+
+        for char in tag:
+            next_node = self.goto[node].get(char)
+
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[node][char] = next_node
+
+            node = next_node
+
+        self.output[node].append(tag_index)
+
+    def build(self):
+        queue = deque(self.goto[0].values())
+
+        while queue:
+            node = queue.popleft()
+
+            for char, next_node in self.goto[node].items():
+                queue.append(next_node)
+
+                fail = self.fail[node]
+                while fail and not char in self.goto[fail]:
+                    fail = self.fail[fail]
+
+                fail = self.goto[fail].get(char, 0)
+                self.fail[next_node] = fail if not fail == next_node else 0
+                self.output[next_node] += self.output[self.fail[next_node]]
+
+    def find(self, name):
+        # indexes of all the tags contained in the name
+        found = set()
+        node = 0
+
+        for char in name.lower():
+            while node and not char in self.goto[node]:
+                node = self.fail[node]
+
+            node = self.goto[node].get(char, 0)
+            found.update(self.output[node])
+
+        return found
+
+    def match(self, name):
+        # the longest tag, and between tags of the same length the first one
+        # in the list, like 'max(matches, key=len)' does
+        found = self.find(name)
+
+        if not found:
+            return 'not labeled'
+
+        best = min(found, key=lambda i: (-len(self.tags[i]), i))
+        return self.tags[best]
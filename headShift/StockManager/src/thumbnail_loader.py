@@ -0,0 +1,145 @@
+# Author: Francisco Jose Contreras Cuevas
+# Office: VFX Artist - Senior Compositor
+# Website: vinavfx.com
+import os
+from collections import OrderedDict
+
+from PySide2.QtCore import (Qt, QObject, QRunnable, QThreadPool, Signal)
+from PySide2.QtGui import (QIcon, QImage, QPixmap, QColor)
+
+from . import indexing
+from ..python_util.util import get_tmp_path
+
+
+def create_thumbnail_tier(indexed, size):
+    # the thumbnail of the tier of 'size' from the thumbnail of the indexing
+    # when it is big enough, otherwise from the middle frame of the preview.
+    # Without the preview, evicted or missing, the thumbnail of the indexing
+    # is only shown scaled up and the tier is made once the preview is back.
+    thumbnail = indexing.get_thumbnail(indexed, size)
+    tier = indexing.get_thumbnail_tier(size)
+
+    image = QImage()
+    save = True
+
+    if tier > indexing.thumbnail_width:
+        frame_data = indexing.get_middle_frame(indexed)
+        if frame_data:
+            image.loadFromData(frame_data)
+
+    if image.isNull():
+        image = QImage(indexing.get_thumbnail(indexed))
+        save = tier <= indexing.thumbnail_width
+
+    if image.isNull():
+        return image
+
+    if not save:
+        return image.scaled(tier, tier, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+    if image.width() > tier or image.height() > tier:
+        image = image.scaled(tier, tier, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+    tmp_thumbnail = get_tmp_path(thumbnail, 'tmp.jpg')
+
+    if image.save(tmp_thumbnail, 'JPG', 95):
+        os.replace(tmp_thumbnail, thumbnail)
+
+    return image
+
+
+class thumbnail_signals(QObject):
+    loaded = Signal(str, object)
+
+
+class thumbnail_job(QRunnable):
+    # reads the jpg in a QThreadPool thread, QImage can be used out of the
+    # main thread, the QPixmap is created when it gets back to it. A tier
+    # that does not exist yet is created here the first time it is asked.
+    def __init__(self, thumbnail, signals, indexed=None, size=0):
+        QRunnable.__init__(self)
+
+        self.thumbnail = thumbnail
+        self.signals = signals
+        self.indexed = indexed
+        self.size = size
+
+    def run(self):
+        image = QImage(self.thumbnail)
+
+        if image.isNull() and self.indexed:
+            image = create_thumbnail_tier(self.indexed, self.size)
+
+        self.signals.loaded.emit(self.thumbnail, image)
+
+
+class thumbnail_loader(QObject):
+    loaded = Signal(str)
+
+    def __init__(self, max_thumbnails=3000, parent=None):
+        QObject.__init__(self, parent)
+
+        self.max_thumbnails = max_thumbnails
+        self.icons = OrderedDict()
+        self.pending = set()
+
+        # the last requested thumbnails are loaded first, so when scrolling
+        # the visible rows are not waiting behind the rows already passed
+        self.priority = 0
+
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(4)
+
+        self.signals = thumbnail_signals()
+        self.signals.loaded.connect(self.thumbnail_loaded)
+
+        placeholder = QPixmap(120, 120)
+        placeholder.fill(QColor(40, 40, 40))
+        self.placeholder = QIcon(placeholder)
+
+    def get(self, thumbnail, indexed=None, size=0, fallback=None):
+        # returns the icon if it is already loaded, otherwise it returns
+        # the 'fallback' icon if it is loaded or the placeholder, and 'loaded'
+        # is emitted once it is ready. With 'indexed' and 'size' the
+        # thumbnail is a tier, created if it does not exist.
+        icon = self.icons.get(thumbnail)
+
+        if not icon is None:
+            self.icons.move_to_end(thumbnail)
+            return icon
+
+        if not thumbnail in self.pending:
+            self.pending.add(thumbnail)
+            self.priority += 1
+            self.pool.start(thumbnail_job(
+                thumbnail, self.signals, indexed, size), self.priority)
+
+        return self.icons.get(fallback, self.placeholder)
+
+    def is_loaded(self, thumbnail):
+        return thumbnail in self.icons
+
+    def forget(self, thumbnails):
+        # the thumbnails are loaded again the next time they are asked
+        for thumbnail in thumbnails:
+            self.icons.pop(thumbnail, None)
+
+    def thumbnail_loaded(self, thumbnail, image):
+        self.pending.discard(thumbnail)
+
+        self.icons[thumbnail] = QIcon(QPixmap.fromImage(image))
+
+        while len(self.icons) > self.max_thumbnails:
+            self.icons.popitem(last=False)
+
+        self.loaded.emit(thumbnail)
+
+    def cancel_pending(self):
+        # queued thumbnails that did not start yet, the running ones still
+        # arrive and are cached
+        self.pool.clear()
+        self.pending = set()
+
+    def clear(self):
+        self.cancel_pending()
+        self.icons.clear()
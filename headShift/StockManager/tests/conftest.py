@@ -0,0 +1,51 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Jose Contreras Cuevas
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+# The tests run without nuke, from the folder that contains StockManager:
+#
+#   python -m pytest StockManager/tests
+
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+import pytest
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+stand_in_dir = os.path.join(tests_dir, 'stand_in')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(tests_dir)))
+
+# the catalog and the previews of 'indexing' go to a temporary folder
+# instead of the .nuke of the user
+data_folder = tempfile.mkdtemp(prefix='stock_manager_tests_')
+os.environ['STOCK_MANAGER_DATA'] = data_folder
+atexit.register(shutil.rmtree, data_folder, True)
+
+
+@pytest.fixture
+def stand_in_pool(monkeypatch):
+    # a pool of python workers that import the nuke module of 'stand_in'
+    from StockManager.nuke_util.worker_pool import worker_pool
+
+    monkeypatch.syspath_prepend(stand_in_dir)
+
+    pool = worker_pool(1, stand_in=True)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def stand_in_workers(monkeypatch):
+    # 'exec_function' with stand-in workers instead of nuke
+    from StockManager.nuke_util import worker_pool
+
+    monkeypatch.syspath_prepend(stand_in_dir)
+    monkeypatch.setenv('NUKE_WORKER_STAND_IN', '1')
+
+    worker_pool.close_pool()
+    yield
+    worker_pool.close_pool()
@@ -0,0 +1,58 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Jose Contreras Cuevas
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+# The part of the nuke module used by the nuke workers, for the stand-in
+# workers of the tests. Executing a Write node writes an empty file for
+# each frame of its 'file' knob, except when it reads a 'corrupt' file.
+
+GUI = False
+
+
+class knob():
+    def __init__(self):
+        self.value = None
+
+    def setValue(self, value):
+        self.value = value
+
+    def fromUserText(self, text):
+        self.value = text
+
+    def getValue(self):
+        return self.value
+
+
+class node():
+    def __init__(self, node_class):
+        self.node_class = node_class
+        self.knobs = {}
+        self.inputs = {}
+
+    def knob(self, name):
+        return self.knobs.setdefault(name, knob())
+
+    def setInput(self, index, input_node):
+        self.inputs[index] = input_node
+
+
+def createNode(node_class):
+    return node(node_class)
+
+
+def execute(write, first_frame, last_frame, continueOnError=False):
+    output = write.knob('file').getValue()
+
+    read = write.inputs[0].inputs[0]
+    if 'corrupt' in read.knob('file').getValue():
+        if continueOnError:
+            return
+        raise RuntimeError('Read error: {}'.format(read.knob('file').getValue()))
+
+    for frame in range(first_frame, last_frame + 1):
+        open(output % frame, 'wb').close()
+
+
+def scriptClear():
+    pass
@@ -0,0 +1,90 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Jose Contreras Cuevas
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from StockManager.src.catalog import catalog
+from StockManager.python_util import process
+
+
+@pytest.fixture
+def db(tmp_path):
+    return catalog(str(tmp_path / 'catalog.db'))
+
+
+def get_stock(name):
+    return ['/stocks/{}/{}_####.exr'.format(name, name), 1001, 1100, 100, True]
+
+
+def get_job_paths(db):
+    return [stock[0] for _, stock, _, _, _ in db.get_jobs(['pending', 'running'])]
+
+
+def test_delete_folder_deletes_its_jobs(db):
+    db.upsert_folders([{'path': '/stocks', 'indexed': False, 'amount': 0},
+                       {'path': '/plates', 'indexed': False, 'amount': 0}])
+
+    db.add_job('/stocks', get_stock('fire'), 'host', 1)
+    db.add_job('/plates', get_stock('smoke'), 'host', 1)
+
+    db.delete_folder('/stocks')
+
+    assert get_job_paths(db) == [get_stock('smoke')[0]]
+
+
+def test_delete_unknown_jobs(db):
+    db.upsert_folders([{'path': '/plates', 'indexed': False, 'amount': 0}])
+
+    db.add_job('/stocks', get_stock('fire'), 'host', 1)
+    db.add_job('/plates', get_stock('smoke'), 'host', 1)
+
+    db.delete_unknown_jobs()
+
+    assert get_job_paths(db) == [get_stock('smoke')[0]]
+
+
+def test_job_owner(db):
+    db.add_job('/stocks', get_stock('fire'), 'farm01', 100)
+    _, _, host, pid, heartbeat = db.get_jobs(['pending'])[0]
+
+    assert (host, pid) == ('farm01', 100)
+
+    db.claim_jobs([get_stock('fire')[0]], 'workstation', 200)
+    db.touch_jobs('workstation', 200)
+
+    _, _, host, pid, touched = db.get_jobs(['pending'])[0]
+
+    assert (host, pid) == ('workstation', 200)
+    assert touched >= heartbeat
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='is_alive takes every process as running on windows')
+def test_is_alive():
+    child = subprocess.Popen([sys.executable, '-c', 'pass'])
+    child.wait()
+
+    assert process.is_alive(os.getpid())
+    assert not process.is_alive(child.pid)
+
+
+def test_rollback_journal(tmp_path):
+    # catalogs switched to WAL by earlier versions go back to the rollback
+    # journal, WAL is not safe on the network filesystems of the homes
+    filename = str(tmp_path / 'catalog.db')
+
+    connection = sqlite3.connect(filename)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.close()
+
+    db = catalog(filename)
+
+    assert db.connection.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+    assert db.connection.execute('PRAGMA busy_timeout').fetchone()[0] > 0
+    assert not os.path.isfile(filename + '-wal')
@@ -0,0 +1,87 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Jose Contreras Cuevas
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+import os
+
+from StockManager.src import converter
+
+
+def get_job(folder, name, first_frame=1001, frames=3):
+    # a job like the ones 'convert' leaves in 'nuke_jobs'
+    tmp_dir = '{}/{}.tmp'.format(folder, name)
+    os.mkdir(tmp_dir)
+
+    return {
+        'src': '/stocks/{}/{}_####.exr'.format(name, name),
+        'output': '{}/{}_%d.jpg'.format(tmp_dir, name),
+        'first_frame': first_frame,
+        'last_frame': first_frame + frames,
+        'scale': 400,
+        'frames': frames,
+        'tmp_dir': tmp_dir,
+        'output_dir': '{}/{}'.format(folder, name),
+        'pack_file': '',
+        'tmp_thumbnail': '',
+        'thumbnail': ''
+    }
+
+
+def test_convert_batch_with_nuke(stand_in_workers, tmp_path):
+    folder = str(tmp_path)
+    jobs = [get_job(folder, 'fire'), get_job(folder, 'smoke', 1, 1)]
+
+    results = converter.convert_batch_with_nuke(jobs)
+
+    assert results == [{'ok': True, 'error': ''}] * 2
+
+    assert sorted(os.listdir('{}/fire'.format(folder))) == [
+        'fire_1001.jpg', 'fire_1002.jpg', 'fire_1003.jpg', 'fire_1004.jpg']
+    assert sorted(os.listdir('{}/smoke'.format(folder))) == ['smoke_1.jpg', 'smoke_2.jpg']
+
+    assert not os.path.isdir(jobs[0]['tmp_dir'])
+
+
+def test_convert_with_nuke(stand_in_workers, tmp_path):
+    # the path 'convert' and 'restore_preview' use when there is no batch
+    job = get_job(str(tmp_path), 'dust', 1, 0)
+
+    result = converter.exec_function(converter.nuke_convert_function, job)
+
+    assert result == {'ok': True, 'error': ''}
+    assert os.listdir(job['tmp_dir']) == ['dust_1.jpg']
+
+
+def test_convert_batch_with_nuke_reports_failures(stand_in_workers, tmp_path):
+    folder = str(tmp_path)
+    jobs = [get_job(folder, 'corrupt'), get_job(folder, 'fire')]
+
+    # frames of ffmpeg before it failed
+    open(jobs[0]['output'] % 1, 'wb').close()
+
+    results = converter.convert_batch_with_nuke(jobs)
+
+    assert results == [{'ok': False, 'error': 'No frame was written'},
+                       {'ok': True, 'error': ''}]
+
+    assert not os.path.isdir('{}/corrupt'.format(folder))
+    assert os.path.isdir('{}/fire'.format(folder))
+
+
+def test_convert_batch_with_nuke_timeout(monkeypatch, tmp_path):
+    # the worker has the timeout of each stock for all the stocks
+    timeouts = []
+
+    def exec_function(function, data, timeout):
+        timeouts.append(timeout)
+        return [{'ok': True, 'error': ''}] * len(data['items'])
+
+    monkeypatch.setattr(converter, 'exec_function', exec_function)
+
+    jobs = [get_job(str(tmp_path), name) for name in ['fire', 'smoke', 'dust']]
+
+    converter.convert_batch_with_nuke(jobs, 600)
+    converter.convert_batch_with_nuke(jobs)
+
+    assert timeouts == [1800, converter.job_timeout * 3]
@@ -0,0 +1,293 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Jose Contreras Cuevas
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+import os
+import sys
+import errno
+import shutil
+import subprocess
+
+import pytest
+
+from StockManager.src import indexing
+from StockManager.src import preview_pack
+from StockManager.python_util.util import get_tmp_path
+
+
+@pytest.fixture
+def fake_ffmpeg(monkeypatch):
+    # ffmpeg writes a frame for every jpg output, and probe reads a 2K stock
+    def run(args, *_, **__):
+        for i, arg in enumerate(args):
+            if not arg.endswith('.jpg') or args[i - 1] == '-i':
+                continue
+
+            if '%d' in arg:
+                frames = int(args[args.index('-frames:v') + 1])
+                filenames = [arg.replace('%d', str(f)) for f in range(1, frames + 1)]
+            else:
+                filenames = [arg]
+
+            for filename in filenames:
+                with open(filename, 'wb') as f:
+                    f.write(b'jpg')
+
+        return 0, '', ''
+
+    metadata = {'frames': 0, 'width': 2048, 'height': 1080, 'fps': 24.0, 'codec': 'exr',
+                'pix_fmt': '', 'duration': 0, 'channel_layout': ''}
+
+    monkeypatch.setattr(indexing.converter.process, 'run', run)
+    monkeypatch.setattr(indexing.converter, 'probe', lambda *_, **__: metadata)
+
+    indexing.load_tags()
+
+
+def index_sequence(folder, name, frames=30):
+    # a sequence of the same frames, whatever its name
+    directory = folder / name
+    directory.mkdir()
+
+    for frame in range(1001, 1001 + frames):
+        (directory / '{}_{}.exr'.format(name, frame)).write_bytes(
+            'frame {}'.format(frame).encode())
+
+    stock = ['{}/{}_####.exr'.format(directory, name), 1001, 1000 + frames, frames, True]
+
+    return indexing.index_stock(str(folder), stock)
+
+
+def test_stock_progress_per_stock():
+    updates = []
+
+    fire = indexing.stock_progress('/stocks/fire.mov', 1, 101, 100, False, updates.append)
+    smoke = indexing.stock_progress('/stocks/smoke.mov', 1, 101, 100, False, updates.append)
+
+    for frame in range(1, 50):
+        fire({'frame': str(frame), 'progress': 'continue'})
+        smoke({'frame': str(frame), 'progress': 'continue'})
+
+    # the throttle of one stock does not hold back the other one
+    assert [(u['name'], u['frame']) for u in updates] == [('fire.mov', 1), ('smoke.mov', 1)]
+
+    # the last block always gets through
+    fire({'frame': '100', 'progress': 'end'})
+
+    assert updates[-1]['name'] == 'fire.mov'
+    assert updates[-1]['finished']
+    assert updates[-1]['percent'] == 100
+
+
+def test_stock_progress_finish():
+    # a conversion that failed or was stopped still ends its progress
+    updates = []
+
+    dust = indexing.stock_progress('/stocks/dust.mov', 1, 101, 100, False, updates.append)
+    dust({'frame': '10', 'progress': 'continue'})
+    dust.finish()
+    dust.finish()
+
+    assert [(u['frame'], u['finished']) for u in updates] == [(10, False), (10, True)]
+
+
+def test_shared_preview_frames(tmp_path, fake_ffmpeg):
+    # copies of a stock with other names share the preview, its frames are
+    # found for all of them
+    fire = index_sequence(tmp_path, 'fire')
+    explosion = index_sequence(tmp_path, 'explosion')
+
+    assert fire['indexed'] == explosion['indexed']
+    assert not fire['name'] == explosion['name']
+
+    frames = preview_pack.get_frame_files(explosion['indexed'])
+
+    assert list(frames) == list(range(1, 30))
+    assert all(os.path.isfile(f) for f in frames.values())
+    assert os.path.basename(frames[1]) == 'frame_1.jpg'
+    assert indexing.get_middle_frame(explosion['indexed']) == b'jpg'
+
+
+def test_packed_preview_keeps_its_thumbnails(tmp_path, fake_ffmpeg):
+    indexing.load_data()
+    indexing.save_indexed_folder(str(tmp_path))
+
+    stock = index_sequence(tmp_path, 'dust', 40)
+    indexing.get_indexed_stocks()[stock['path']] = stock
+    indexing.db.upsert_stock(stock)
+
+    thumbnail = indexing.get_thumbnail(stock['indexed'])
+    assert os.path.isfile(thumbnail)
+
+    assert indexing.pack_previews() == 1
+    assert preview_pack.is_packed(stock['indexed'])
+
+    # the refresh after the packing collects the previews without stocks
+    indexing.refresh_indexs(set(), set())
+    indexing.garbage_remove()
+
+    assert indexing.preview_exists(stock['indexed'])
+    assert indexing.get_thumbnail(stock['indexed']) == thumbnail
+    assert os.path.isfile(thumbnail)
+
+
+def test_unreadable_directory_keeps_its_stocks(tmp_path, monkeypatch):
+    folder = str(tmp_path)
+    directory = '{}/fire'.format(folder)
+    os.mkdir(directory)
+
+    for frame in range(1001, 1031):
+        with open('{}/fire_{}.exr'.format(directory, frame), 'wb') as f:
+            f.write(b'exr')
+
+    stocks = [stock for stock, _ in indexing.get_stocks_from_folder(folder)]
+    assert [stock[0] for stock in stocks] == [directory + '/fire_####.exr']
+
+    scandir = os.scandir
+
+    def unreadable(path):
+        if path == directory:
+            raise OSError(errno.EIO, 'Input/output error', path)
+        return scandir(path)
+
+    monkeypatch.setattr(indexing.os, 'scandir', unreadable)
+
+    # the stocks of the last scan are kept
+    incomplete = set()
+    assert [stock for stock, _ in indexing.get_stocks_from_folder(folder, incomplete)] == stocks
+    assert not incomplete
+
+    # without the manifest its stocks are not known
+    del indexing.manifest[folder]
+    assert not list(indexing.get_stocks_from_folder(folder, incomplete))
+    assert incomplete == set([folder])
+
+    # a directory that does not exist anymore has no stocks
+    monkeypatch.undo()
+    shutil.rmtree(directory)
+
+    incomplete = set()
+    assert not list(indexing.get_stocks_from_folder(folder, incomplete))
+    assert not incomplete
+
+
+def test_stock_without_preview_is_indexed_again(tmp_path, fake_ffmpeg, monkeypatch):
+    # ffmpeg writes nothing and there is no nuke to convert the stock
+    conversions = []
+
+    def run(args, *_, **__):
+        conversions.append(args)
+        return 1, '', 'Error'
+
+    monkeypatch.setattr(indexing.converter.process, 'run', run)
+    monkeypatch.setattr(indexing.converter, 'get_nuke_executable', lambda: '')
+
+    indexing.load_data()
+
+    folder = str(tmp_path)
+    indexing.save_indexed_folder(folder)
+
+    for frame in range(1001, 1031):
+        with open('{}/smoke_{}.exr'.format(folder, frame), 'wb') as f:
+            f.write(b'exr')
+
+    def index():
+        indexing.to_index(lambda: None, lambda *_: None, lambda *_: None,
+                          lambda: False, [folder])
+
+    index()
+
+    assert len(conversions) == 1
+    assert not folder + '/smoke_####.exr' in indexing.get_indexed_stocks()
+
+    # the directory did not change, the stock is converted again
+    index()
+
+    assert len(conversions) == 2
+
+
+def test_garbage_remove_leaves_running_indexings(monkeypatch):
+    indexing.load_data()
+
+    # a process of this host that is not running anymore
+    finished = subprocess.Popen([sys.executable, '-c', 'pass'])
+    finished.wait()
+
+    preview = '{}/{}'.format(indexing.index_folder, 'a' * 32)
+
+    converting = get_tmp_path(preview)
+    abandoned = '{}.{}-{}-1.tmp'.format(preview, indexing.job_host, finished.pid)
+    unknown = '{}/unknown'.format(indexing.index_folder)
+
+    for directory in [converting, abandoned, unknown]:
+        os.mkdir(directory)
+
+    # another indexing may have just made them
+    indexing.garbage_remove()
+    assert all(os.path.isdir(d) for d in [converting, abandoned, unknown])
+
+    monkeypatch.setattr(indexing, 'job_heartbeat_timeout', -1)
+    indexing.garbage_remove()
+
+    assert os.path.isdir(converting)
+    assert not os.path.isdir(abandoned)
+    assert not os.path.isdir(unknown)
+
+    os.rmdir(converting)
+
+
+def test_unfinished_jobs_are_resumed_a_few_times(tmp_path):
+    indexing.load_data()
+
+    folder = str(tmp_path)
+    indexing.save_indexed_folder(folder)
+
+    stock = [folder + '/fire_####.exr', 1001, 1100, 100, True]
+    indexing.db.add_job(folder, stock, indexing.job_host, os.getpid())
+
+    def is_resumed():
+        return stock in [s for _, s in indexing.get_unfinished_jobs()[0]]
+
+    for _ in range(indexing.max_job_attempts):
+        assert is_resumed()
+
+        # started, and left running by a crash
+        indexing.db.set_job_state(stock[0], 'running')
+
+    assert not is_resumed()
+
+    indexing.delete_folder(folder)
+
+
+def test_stock_progress_preview_frames():
+    # the progress counts the frames of the preview, not of the stock
+    long_stock = indexing.stock_progress('/stocks/rain.mov', 1, 5001, 5000, False, None)
+    short_stock = indexing.stock_progress('/stocks/spark.mov', 1, 41, 40, False, None)
+
+    assert long_stock.frames == indexing.converter.max_preview_frames
+    assert short_stock.frames == 40
+
+
+def test_crawl_error_ends_the_indexing(tmp_path, monkeypatch):
+    indexing.load_data()
+
+    folder = str(tmp_path)
+    indexing.save_indexed_folder(folder)
+
+    def crawl(*_):
+        raise OSError('crawl failed')
+        yield
+
+    monkeypatch.setattr(indexing, 'get_stocks_from_folder', crawl)
+
+    finished = []
+
+    with pytest.raises(OSError):
+        indexing.to_index(lambda: finished.append(True), lambda *_: None, lambda *_: None,
+                          lambda: False, [folder])
+
+    assert not finished
+    assert not indexing.is_indexing()
+
+    indexing.delete_folder(folder)
@@ -0,0 +1,31 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Jose Contreras Cuevas
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+import sys
+import time
+
+import pytest
+
+from StockManager.python_util import process
+
+
+def test_run_returns_when_the_process_ends():
+    start = time.time()
+
+    for _ in range(5):
+        returncode, out, _ = process.run([sys.executable, '-c', 'print("done")'])
+        assert (returncode, out.strip()) == (0, 'done')
+
+    # not a poll interval for each run
+    assert time.time() - start < 5 * process.poll_interval
+
+
+def test_run_timeout():
+    start = time.time()
+
+    with pytest.raises(process.process_timeout):
+        process.run([sys.executable, '-c', 'import time; time.sleep(30)'], timeout=0.5)
+
+    assert time.time() - start < 5
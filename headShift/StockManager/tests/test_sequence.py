@@ -0,0 +1,74 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Jose Contreras Cuevas
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+from sequence_util import sequence, sequence_cache
+
+
+def get_sequences(filenames):
+    _, sequences = sequence.group(filenames)
+    return [(s.get_pattern(), s.first(), s.last()) for s in sequences]
+
+
+def test_vfx_frame_range():
+    # the 4 digits of the frame numbers are the padding, as in nuke
+    filenames = ['plate.{}.exr'.format(f) for f in range(1001, 1031)]
+
+    assert get_sequences(filenames) == [('plate.####.exr', 1001, 1030)]
+
+
+def test_zero_padded():
+    filenames = ['plate.{:04d}.exr'.format(f) for f in range(1, 11)]
+
+    assert get_sequences(filenames) == [('plate.####.exr', 1, 10)]
+
+
+def test_padded_and_not_padded_numbers():
+    filenames = ['plate.{:04d}.exr'.format(f) for f in range(998, 1003)]
+
+    assert get_sequences(filenames) == [('plate.####.exr', 998, 1002)]
+
+
+def test_not_padded():
+    filenames = ['plate.{}.exr'.format(f) for f in range(8, 13)]
+
+    assert get_sequences(filenames) == [('plate.#.exr', 8, 12)]
+
+
+def test_mixed_paddings():
+    filenames = ['plate.{:04d}.exr'.format(f) for f in range(1, 4)]
+    filenames += ['plate.{:06d}.exr'.format(f) for f in range(1, 3)]
+
+    assert get_sequences(filenames) == [
+        ('plate.####.exr', 1, 3), ('plate.######.exr', 1, 2)]
+
+
+def test_singles():
+    singles, sequences = sequence.group(['notes.txt', 'plate.1001.exr'])
+
+    assert singles == ['notes.txt']
+    assert [(s.get_pattern(), len(s)) for s in sequences] == [('plate.####.exr', 1)]
+
+
+def test_vfx_frame_range_on_disk(tmp_path):
+    for frame in range(1001, 1011):
+        (tmp_path / 'plate.{}.exr'.format(frame)).touch()
+
+    path = '{}/plate.####.exr'.format(tmp_path)
+
+    assert sequence_cache.get_sequence(path).frames == list(range(1001, 1011))
+    assert sequence_cache.get_sequence(path.replace('####', '%04d')).first() == 1001
+
+
+def test_fresh_directory_listing(tmp_path):
+    # a directory modified right now is not listed again on every call,
+    # only once its retry time is over
+    (tmp_path / 'plate.1001.exr').touch()
+
+    listing = sequence_cache.get_listing(str(tmp_path))
+    assert not listing.trusted
+    assert sequence_cache.get_listing(str(tmp_path)) is listing
+
+    listing.retry = 0
+    assert not sequence_cache.get_listing(str(tmp_path)) is listing
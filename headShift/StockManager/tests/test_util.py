@@ -0,0 +1,65 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Jose Contreras Cuevas
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+import threading
+
+import pytest
+
+from StockManager.python_util import util
+from StockManager.python_util.process import process_cancelled
+
+
+def test_thread_pool_stop_is_quiet(capsys):
+    stop = threading.Event()
+    done = []
+
+    def job(number):
+        if number == 2:
+            stop.set()
+            raise process_cancelled('ffmpeg: stopped')
+
+        return number
+
+    util.thread_pool(job, [(n,) for n in range(5)], 1, stop.is_set,
+                     lambda item, result: done.append(result))
+
+    assert done == [0, 1]
+    assert capsys.readouterr().err == ''
+
+
+def test_thread_pool_reports_errors(capsys):
+    def job(number):
+        raise ValueError('broken stock')
+
+    util.thread_pool(job, [(1,)], 1)
+
+    assert 'broken stock' in capsys.readouterr().err
+
+
+def test_thread_pool_raises_items_errors():
+    done = []
+
+    def items():
+        yield (1,)
+        yield (2,)
+        raise OSError('crawl failed')
+
+    with pytest.raises(OSError, match='crawl failed'):
+        util.thread_pool(lambda n: n, items(), 2, None,
+                         lambda item, result: done.append(result))
+
+    # the jobs taken before the error are done
+    assert sorted(done) == [1, 2]
+
+
+def test_tmp_owner(monkeypatch):
+    monkeypatch.setattr(util.socket, 'gethostname', lambda: 'render-01.farm.local')
+
+    tmp_path = util.get_tmp_path('/previews/6d1f.pack')
+
+    assert util.get_tmp_owner(tmp_path, ['ws-02', 'render-01.farm.local']) == \
+        ('render-01.farm.local', util.os.getpid())
+    assert util.get_tmp_owner(tmp_path, ['farm.local-01']) is None
+    assert util.get_tmp_owner('/previews/6d1f.pack', ['render-01.farm.local']) is None
@@ -0,0 +1,34 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Jose Contreras Cuevas
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+import pytest
+
+from StockManager.src import converter
+from StockManager.nuke_util.worker_pool import worker_error
+
+
+def test_module_function(stand_in_pool):
+    assert stand_in_pool.call('StockManager.src.converter.get_rate', '24000/1001') == 23.976
+
+
+def test_attribute_path(stand_in_pool):
+    # 'os' is not a submodule of the converter, it is resolved as attribute
+    assert stand_in_pool.call('StockManager.src.converter.os.path.basename', '/a/b.exr') == 'b.exr'
+
+
+def test_converter_paths(stand_in_pool, tmp_path):
+    # the paths 'convert' and 'convert_batch_with_nuke' send to the workers
+    item = {'src': '', 'output': str(tmp_path / 'f_%d.jpg'), 'first_frame': 1, 'last_frame': 1,
+            'scale': 400, 'frames': 0, 'tmp_dir': str(tmp_path)}
+
+    assert stand_in_pool.call(converter.nuke_convert_function, item) == {'ok': True, 'error': ''}
+    assert stand_in_pool.call(converter.nuke_batch_function, {'items': []}) == []
+
+
+def test_missing_module(stand_in_pool):
+    with pytest.raises(worker_error) as error:
+        stand_in_pool.call('StockManager.not_a_module.function', None)
+
+    assert 'No module named' in str(error.value)
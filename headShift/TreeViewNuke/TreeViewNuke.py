@@ -1,6 +1,5 @@
 import sys
 import os
-import re
 from PySide2 import QtWidgets, QtCore, QtGui
 from PySide2.QtWidgets import *
 from PySide2.QtCore import *
@@ -8,11 +7,30 @@ from PySide2.QtGui import *
 import nuke
 import nukescripts
 
+# Directory listings shared with StockManager and ProjectBrowser
+from sequence_util import sequence_cache
+
 # Valid file format
 VALID_IMAGE_EXTENSIONS = {".jpg", ".png", ".dpx", ".exr"}
 VALID_VIDEO_EXTENSIONS = {".mov"}
 MAX_SELECTED_FOLDERS = 100  # Limit the number of selected folders
 
+
+def get_image_sequence(folder):
+    """Returns (file_pattern, first_frame, last_frame) of the first image sequence
+    of the folder with a 3 or 4 digits frame number ('name.####.exr'), or None"""
+    for sequence in sequence_cache.get_sequences(folder):
+        if not sequence.prefix.endswith(".") or f".{sequence.ext.lower()}" not in VALID_IMAGE_EXTENSIONS:
+            continue
+
+        if not 3 <= sequence.padding <= 4:
+            continue
+
+        return sequence.get_pattern(), sequence.first(), sequence.last()
+
+    return None
+
+
 class FileBrowser(QtWidgets.QWidget):
     def __init__(self, parent=None):
         super(FileBrowser, self).__init__(parent)
@@ -187,14 +205,14 @@ class FileBrowser(QtWidgets.QWidget):
     def has_subfolders(self, folder):
         """Checks if the folder has subfolders"""
         try:
-            return any(os.path.isdir(os.path.join(folder, entry)) for entry in os.listdir(folder))
+            return bool(sequence_cache.get_directories(folder))
         except PermissionError:
             return False
 
     def has_valid_files(self, folder, valid_extensions):
         """Checks if the folder contains valid files"""
         try:
-            return any(file.lower().endswith(tuple(valid_extensions)) for file in os.listdir(folder))
+            return any(file.lower().endswith(tuple(valid_extensions)) for file in sequence_cache.get_files(folder))
         except PermissionError:
             return False
 
@@ -268,20 +286,12 @@ class FileBrowser(QtWidgets.QWidget):
 
     def create_image_sequence_read_node(self, folder):
         """Creates a Read node for Image Sequence"""
-        # Fix the pattern to recognize both ### and #### formats
-        files = sorted(f for f in os.listdir(folder) if re.match(r".*\.(\d{3,4})\.(jpg|png|dpx|exr)$", f.lower()))
-        if not files:
+        # Recognizes both ### and #### formats
+        image_sequence = get_image_sequence(folder)
+        if not image_sequence:
             return False, f"No image sequence found in '{folder}'"
 
-        # Get the first and last frame numbers based on the number of digits in the pattern
-        digits = len(files[0].split(".")[-2])
-        firstFrame = int(files[0].split(".")[-2])
-        lastFrame = int(files[-1].split(".")[-2])
-
-        base_name, extension = files[0].rsplit(".", 2)[0], files[0].rsplit(".", 1)[-1]
-        
-        # Create a file pattern based on the number of digits
-        file_pattern = f"{base_name}.{'#' * digits}.{extension}"
+        file_pattern, firstFrame, lastFrame = image_sequence
         imageSequencePath = os.path.join(folder, file_pattern).replace("\\", "/")
 
         readNode = nuke.createNode("Read")
@@ -371,20 +381,10 @@ def create_read_node_from_drop(mime_data, text=None):
             # Check if the path is a folder or a file
             if os.path.isdir(folder_path):
                 # If it is a folder, check if it is an Image Sequence or Video MOV
-                if any(re.match(r".*\.(\d{3,4})\.(jpg|png|dpx|exr)$", f) for f in os.listdir(folder_path)):
+                image_sequence = get_image_sequence(folder_path)
+                if image_sequence:
                     # Create a Read node for Image Sequence
-                    files = sorted(f for f in os.listdir(folder_path) if re.match(r".*\.(\d{3,4})\.(jpg|png|dpx|exr)$", f))
-                    
-                    # Get the first and last frame numbers based on the number of digits in the pattern
-                    digits = len(files[0].split(".")[-2])
-                    first_frame = int(files[0].split(".")[-2])
-                    last_frame = int(files[-1].split(".")[-2])
-
-                    base_name = files[0].rsplit(".", 2)[0]
-                    extension = files[0].rsplit(".", 1)[-1]
-
-                    # Create a file pattern based on the number of digits
-                    file_pattern = f"{base_name}.{'#' * digits}.{extension}"
+                    file_pattern, first_frame, last_frame = image_sequence
                     image_sequence_path = os.path.join(folder_path, file_pattern).replace("\\", "/")
 
                     read_node = nuke.createNode("Read")
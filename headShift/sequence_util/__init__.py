@@ -0,0 +1,13 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Jose Contreras Cuevas
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+# Frame sequences and directory listings shared by StockManager,
+# TreeViewNuke and ProjectBrowser. It only uses the standard library, so
+# importing it does not load Nuke, Qt or any of the plugins, and there is
+# a single cache in the process whichever plugin imports it first.
+from . import (
+    sequence,
+    sequence_cache
+)
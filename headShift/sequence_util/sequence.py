@@ -0,0 +1,169 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Jose Contreras Cuevas
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+import os
+import re
+
+# Frame sequences detected from a directory listing, without Nuke.
+#
+# A filename is split in prefix, frame number and extension, the frame
+# number being the last group of digits right before the extension:
+#
+#   'fire_v002.0001.exr'  ->  'fire_v002.', '0001', 'exr'
+#
+# The files are grouped by prefix, extension and padding. A zero padded
+# number ('0012') gives the padding, a number without leading zeros is part
+# of the longest padding not longer than it ('10000' with padding 4) or
+# of the not padded sequence. Numbers without leading zeros that all have
+# the same width take it as padding, as nuke lists them: '1001' to '1030'
+# is 'fire.####.exr'.
+
+filename_pattern = re.compile(r'^(.*\D|)(\d+)\.([^.]+)$')
+notation_pattern = re.compile(r'(#+|@+|%0?(\d*)d)')
+
+
+def tokenize(filename):
+    # returns (prefix, number, extension) or None if it has no frame number
+    match = filename_pattern.match(filename)
+    return match.groups() if match else None
+
+
+class file_sequence():
+    def __init__(self, directory, prefix, padding, ext, frames):
+        self.directory = directory
+        self.prefix = prefix
+        self.padding = padding
+        self.ext = ext
+        self.frames = sorted(frames)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def first(self):
+        return self.frames[0]
+
+    def last(self):
+        return self.frames[-1]
+
+    def get_pattern(self, notation='#'):
+        # 'fire_####.exr' or with notation '%d', 'fire_%04d.exr'
+        if notation == '#':
+            padding = '#' * max(1, self.padding)
+        elif self.padding:
+            padding = '%0{}d'.format(self.padding)
+        else:
+            padding = '%d'
+
+        return '{}{}.{}'.format(self.prefix, padding, self.ext)
+
+    def get_filename(self, frame):
+        return '{}{}.{}'.format(self.prefix, str(frame).zfill(self.padding), self.ext)
+
+
+def join(directory, filename):
+    if not directory:
+        return filename
+
+    return '{}/{}'.format(directory, filename)
+
+
+def group(filenames, directory=''):
+    # groups the filenames of one directory listing, returns the filenames
+    # without frame number and the sequences, single numbered files are
+    # sequences of one frame.
+    singles = []
+    numbers_by_name = {}
+    match = filename_pattern.match
+
+    for filename in filenames:
+        tokens = match(filename)
+
+        if not tokens:
+            singles.append(filename)
+            continue
+
+        prefix, number, ext = tokens.groups()
+        key = (prefix, ext)
+
+        numbers = numbers_by_name.get(key)
+        if numbers is None:
+            numbers_by_name[key] = [number]
+        else:
+            numbers.append(number)
+
+    sequences = []
+
+    for key in sorted(numbers_by_name):
+        prefix, ext = key
+        numbers = numbers_by_name[key]
+
+        padded = [n for n in numbers if n[0] == '0' and len(n) > 1]
+        paddings = sorted(set(map(len, padded)))
+
+        if not paddings:
+            widths = set(map(len, numbers))
+            padding = widths.pop() if len(widths) == 1 else 0
+
+            frames_by_padding = {padding: list(map(int, numbers))}
+
+        elif len(padded) == len(numbers) and len(paddings) == 1:
+            frames_by_padding = {paddings[0]: list(map(int, numbers))}
+
+        else:
+            frames_by_padding = {}
+
+            for number in numbers:
+                if number[0] == '0' and len(number) > 1:
+                    padding = len(number)
+                else:
+                    padding = 0
+                    for p in paddings:
+                        if p > len(number):
+                            break
+                        padding = p
+
+                frames_by_padding.setdefault(padding, []).append(int(number))
+
+        for padding in sorted(frames_by_padding):
+            sequences.append(file_sequence(
+                directory, prefix, padding, ext, frames_by_padding[padding]))
+
+    return singles, sequences
+
+
+def parse(path):
+    # splits 'fire_####.exr', 'fire_%04d.exr' or 'fire_%d.exr' in
+    # (directory, prefix, padding, extension), padding is None when the path
+    # has no padding notation
+    directory, filename = os.path.split(path.replace('\\', '/'))
+
+    matches = list(notation_pattern.finditer(filename))
+    if not matches:
+        return directory, filename, None, ''
+
+    match = matches[-1]
+    notation = match.group(1)
+
+    if notation[0] in '#@':
+        padding = len(notation)
+    else:
+        padding = int(match.group(2) or 0)
+
+    prefix = filename[:match.start()]
+    suffix = filename[match.end():]
+    ext = suffix[1:] if suffix.startswith('.') else suffix
+
+    return directory, prefix, padding, ext
+
+
+def get_frame_path(path, frame):
+    # the file of one frame of a sequence path in any notation
+    directory, prefix, padding, ext = parse(path)
+
+    if padding is None:
+        return path
+
+    return join(directory, '{}{}.{}'.format(prefix, str(frame).zfill(padding), ext))
+
@@ -0,0 +1,179 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Jose Contreras Cuevas
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+# Process-wide cache of directory listings and of their sequences, so the
+# tools that browse the same plate directories list each of them once.
+#
+# A listing is valid while the mtime of its directory does not change, the
+# directories are kept in LRU order and only the last 'max_directories'
+# stay in the cache. It can be used from any thread.
+#
+# A directory modified right before its listing may change again within the
+# same mtime, so its listing is only used for 'retry_interval' seconds before
+# the directory is listed again, instead of listing it on every call.
+
+import os
+import time
+import bisect
+import threading
+from collections import OrderedDict
+
+from . import sequence
+
+max_directories = 256
+
+# directories modified this close (in seconds) to their listing are listed
+# again, since a change within the same mtime tick would go unnoticed
+mtime_resolution = 2
+retry_interval = 0.5
+
+cache = OrderedDict()
+lock = threading.Lock()
+
+
+class listing():
+    def __init__(self, directory, mtime, files, directories, trusted, retry=0):
+        self.directory = directory
+        self.mtime = mtime
+        self.files = files
+        self.directories = directories
+        self.trusted = trusted
+        self.retry = retry
+
+        self.groups = None
+        self.sequences_by_name = {}
+        self.groups_lock = threading.Lock()
+
+    def get_groups(self):
+        # (singles, sequences) of the files, grouped the first time
+        with self.groups_lock:
+            if self.groups is None:
+                self.groups = sequence.group(self.files, self.directory)
+
+                for _sequence in self.groups[1]:
+                    key = (_sequence.prefix, _sequence.ext)
+                    self.sequences_by_name.setdefault(key, []).append(_sequence)
+
+        return self.groups
+
+    def get_sequences_by_name(self, prefix, ext):
+        self.get_groups()
+        return self.sequences_by_name.get((prefix, ext), [])
+
+
+def normalize(directory):
+    return os.path.normpath(directory).replace('\\', '/')
+
+
+def get_listing(directory):
+    # the listing of a directory, from the cache while it is not modified,
+    # an empty listing if it can not be read
+    directory = normalize(directory)
+
+    try:
+        mtime = os.stat(directory).st_mtime
+    except OSError:
+        return listing(directory, 0, [], [], False)
+
+    now = time.time()
+
+    with lock:
+        cached = cache.get(directory)
+
+        if cached and cached.mtime == mtime and (cached.trusted or now < cached.retry):
+            cache.move_to_end(directory)
+            return cached
+
+    files = []
+    directories = []
+
+    try:
+        for entry in os.scandir(directory):
+            try:
+                if entry.is_dir():
+                    directories.append(entry.name)
+                else:
+                    files.append(entry.name)
+            except OSError:
+                continue
+    except OSError:
+        return listing(directory, 0, [], [], False)
+
+    trusted = now - mtime > mtime_resolution
+    new = listing(directory, mtime, files, directories, trusted, now + retry_interval)
+
+    with lock:
+        cache[directory] = new
+        cache.move_to_end(directory)
+
+        while len(cache) > max_directories:
+            cache.popitem(last=False)
+
+    return new
+
+
+def get_files(directory):
+    return get_listing(directory).files
+
+
+def get_directories(directory):
+    return get_listing(directory).directories
+
+
+def get_sequences(directory):
+    return get_listing(directory).get_groups()[1]
+
+
+def get_sequence(path):
+    # the sequence of a path in any notation ('fire_####.exr', 'fire_%04d.exr'),
+    # or None if it is not on disk
+    directory, prefix, padding, ext = sequence.parse(path)
+
+    if padding is None:
+        return None
+
+    if padding == 1:
+        # '#' and '%d' are also used for not padded sequences
+        paddings = [0, 1]
+    else:
+        paddings = [padding]
+
+    for _sequence in get_listing(directory or '.').get_sequences_by_name(prefix, ext):
+        if _sequence.padding in paddings:
+            return _sequence
+
+    return None
+
+
+def get_file_sequence(path):
+    # the sequence a frame file belongs to, or None if the file has no
+    # frame number or is not on disk
+    directory, filename = os.path.split(path.replace('\\', '/'))
+
+    tokens = sequence.tokenize(filename)
+    if not tokens:
+        return None
+
+    prefix, number, ext = tokens
+    frame = int(number)
+
+    for _sequence in get_listing(directory or '.').get_sequences_by_name(prefix, ext):
+        if not _sequence.get_filename(frame) == filename:
+            continue
+
+        index = bisect.bisect_left(_sequence.frames, frame)
+        if index < len(_sequence.frames) and _sequence.frames[index] == frame:
+            return _sequence
+
+    return None
+
+
+def invalidate(directory=None):
+    # forgets a directory, or all of them
+    with lock:
+        if directory is None:
+            cache.clear()
+        else:
+            cache.pop(normalize(directory), None)